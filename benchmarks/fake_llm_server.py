@@ -0,0 +1,221 @@
+"""
+    Local OpenAI compatible chat completions server for benchmarks and manual
+    testing, with configurable latency, jitter, error rate and rate limit.
+    Repeated system messages are reported as cached prompt tokens once they
+    reach the provider's minimum cacheable prefix.
+
+    python3 benchmarks/fake_llm_server.py --port 8765 --latency 0.2 --rpm 600
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python3 main.py --dir examples
+
+    It can also answer batch job files written by `main.py --batch-export`:
+
+    python3 benchmarks/fake_llm_server.py --batch requests.jsonl --batch-output results.jsonl
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+def fake_completion(body: dict) -> str:
+    messages = body.get('messages', [])
+    digest = hashlib.sha256(json.dumps(messages).encode()).hexdigest()[:12]
+    # The shared system message describes every format, the task is last
+    task = messages[-1]['content'] if messages else ''
+    # Batched function documentation expects a JSON object keyed by id
+    ids = re.findall(r'function id: (\d+)', task)
+    if ids:
+        return json.dumps({i: f"* function {i}: fake documentation {digest}" for i in ids})
+    # Directory summary and README body in one request
+    if 'in format G' in task:
+        return json.dumps({
+            "summary": f"* directory: fake documentation {digest}",
+            "readme": f"# directory\nfake documentation {digest}",
+        })
+    return f"* generated: fake documentation {digest}"
+
+
+def answer_batch(requests_path: str, results_path: str, error_rate: float = 0.0, seed: int = 0):
+    """Produce a provider style batch job results JSONL for a requests JSONL"""
+    rng = random.Random(seed)
+    with open(requests_path) as requests, open(results_path, 'w') as results:
+        for line in requests:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            if rng.random() < error_rate:
+                result = {'custom_id': request['custom_id'], 'response': None,
+                          'error': {'code': 'server_error', 'message': 'Injected failure'}}
+            else:
+                content = fake_completion(request['body'])
+                result = {'custom_id': request['custom_id'], 'error': None, 'response': {
+                    'status_code': 200,
+                    'body': {'choices': [{'index': 0, 'message': {
+                        'role': 'assistant', 'content': content}}]},
+                }}
+            results.write(json.dumps(result) + '\n')
+
+
+class FakeLLMServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 rpm: Optional[float] = None, retry_after: float = 1.0, seed: int = 0,
+                 min_cached_prefix: int = 1024):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        # Providers only cache prompt prefixes of at least this many tokens
+        self.min_cached_prefix = min_cached_prefix
+
+        self.lock = threading.Lock()
+        self.window: list[float] = []
+        # System messages seen so far, served from the simulated prefix cache
+        self.prefixes: set[str] = set()
+        self.stats = {'requests': 0, 'completions': 0,
+                      'errors': 0, 'rate_limited': 0, 'prompt_tokens': 0,
+                      'cached_tokens': 0}
+
+        self.httpd = ThreadingHTTPServer((host, port), self.handler())
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                status, headers, payload = server.respond(body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def respond(self, body: dict):
+        now = time.monotonic()
+        with self.lock:
+            self.stats['requests'] += 1
+            if self.rpm is not None:
+                # One second sliding window so limits recover quickly
+                self.window = [t for t in self.window if t > now - 1]
+                if len(self.window) >= self.rpm / 60:
+                    self.stats['rate_limited'] += 1
+                    return 429, {'Retry-After': str(self.retry_after)}, {
+                        'error': {'message': 'Rate limit reached', 'type': 'rate_limit'}}
+                self.window.append(now)
+            failed = self.random.random() < self.error_rate
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+
+        time.sleep(delay)
+        if failed:
+            with self.lock:
+                self.stats['errors'] += 1
+            return 500, {}, {'error': {'message': 'Injected failure', 'type': 'server_error'}}
+
+        messages = body.get('messages', [])
+        prompt_tokens = len(json.dumps(messages)) // 4
+        prefix = json.dumps(messages[:1])
+        prefix_tokens = len(prefix) // 4
+        content = self.complete(body)
+        with self.lock:
+            cached_tokens = 0
+            if prefix_tokens >= self.min_cached_prefix:
+                cached_tokens = prefix_tokens if prefix in self.prefixes else 0
+                self.prefixes.add(prefix)
+            self.stats['completions'] += 1
+            self.stats['prompt_tokens'] += prompt_tokens
+            self.stats['cached_tokens'] += cached_tokens
+        return 200, {}, {
+            'id': 'chatcmpl-fake',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop',
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': len(content) // 4,
+                'total_tokens': prompt_tokens + len(content) // 4,
+                'prompt_tokens_details': {'cached_tokens': cached_tokens},
+            },
+        }
+
+    def complete(self, body: dict) -> str:
+        return fake_completion(body)
+
+    def start(self) -> 'FakeLLMServer':
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    agp = argparse.ArgumentParser(prog="Fake OpenAI compatible server")
+    agp.add_argument('--host', default='127.0.0.1')
+    agp.add_argument('--port', type=int, default=8765)
+    agp.add_argument('--latency', type=float, default=0.0,
+                     help="Seconds spent on every completion")
+    agp.add_argument('--jitter', type=float, default=0.0,
+                     help="Random +/- seconds added to the latency")
+    agp.add_argument('--error-rate', type=float, default=0.0,
+                     help="Fraction of requests answered with a 500")
+    agp.add_argument('--rpm', type=float, default=None,
+                     help="Requests per minute before answering 429")
+    agp.add_argument('--retry-after', type=float, default=1.0,
+                     help="Retry-After seconds sent with 429 responses")
+    agp.add_argument('--min-cached-prefix', type=int, default=1024,
+                     help="Minimum system message tokens served from the simulated prefix cache")
+    agp.add_argument('--batch', metavar='REQUESTS',
+                     help="Answer a batch job requests JSONL instead of serving")
+    agp.add_argument('--batch-output', metavar='RESULTS',
+                     help="Where to write the batch job results JSONL")
+    args = agp.parse_args()
+
+    if args.batch:
+        answer_batch(args.batch, args.batch_output or 'results.jsonl',
+                     error_rate=args.error_rate)
+        return
+
+    server = FakeLLMServer(
+        host=args.host, port=args.port, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, rpm=args.rpm, retry_after=args.retry_after,
+        min_cached_prefix=args.min_cached_prefix,
+    )
+    print(f"Serving on {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(server.stats))
+
+
+if __name__ == '__main__':
+    main()
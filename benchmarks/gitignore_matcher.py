@@ -0,0 +1,118 @@
+"""
+    Compare the fnmatch based `gitignore.is_ignored` with the compiled
+    `gitignore.IgnoreRules` on synthetic project paths.
+
+    python3 benchmarks/gitignore_matcher.py --paths 100000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gitignore import IgnoreRules, is_ignored  # noqa: E402
+
+PATTERNS = [
+    '# build output',
+    '/build/',
+    '/dist/',
+    'node_modules/',
+    '__pycache__/',
+    '*.py[cod]',
+    '*.so',
+    '*.log',
+    '!important.log',
+    '.venv/',
+    'coverage/',
+    'docs/**/*.html',
+    '/test_output.txt',
+    'tmp*/',
+    '.DS_Store',
+]
+
+DIR_NAMES = ['src', 'lib', 'core', 'utils', 'api', 'docs', 'tests', 'build',
+             'node_modules', '__pycache__', 'tmp_cache', 'coverage', 'models']
+FILE_NAMES = ['main', 'util', 'index', 'model', 'view', 'test', 'important']
+EXTENSIONS = ['.py', '.pyc', '.js', '.go', '.rs', '.md', '.log', '.html', '.so']
+
+
+def generate_paths(count: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    paths = set()
+    while len(paths) < count:
+        depth = rng.randint(0, 5)
+        parts = [rng.choice(DIR_NAMES) + (str(rng.randint(0, 3)) if rng.random() < 0.5 else '')
+                 for _ in range(depth)]
+        parts.append(f"{rng.choice(FILE_NAMES)}{rng.randint(0, 99)}{rng.choice(EXTENSIONS)}")
+        paths.add('/'.join(parts))
+    return sorted(paths)
+
+
+def build_tree(paths: list[str]) -> dict:
+    tree = {}
+    for path in paths:
+        node = tree
+        for part in path.split('/')[:-1]:
+            node = node.setdefault(part, {})
+        node[path.rsplit('/', 1)[-1]] = None
+    return tree
+
+
+def pruned_walk(rules: IgnoreRules, tree: dict, rel_dir: str = '') -> tuple[int, int]:
+    """Walk like the project walker does, returns (checks, kept files)"""
+    checks = kept = 0
+    for name, children in tree.items():
+        rel_path = f"{rel_dir}/{name}" if rel_dir else name
+        checks += 1
+        if rules.match(rel_path, is_dir=children is not None):
+            continue
+        if children is None:
+            kept += 1
+        else:
+            sub_checks, sub_kept = pruned_walk(rules, children, rel_path)
+            checks += sub_checks
+            kept += sub_kept
+    return checks, kept
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    agp = argparse.ArgumentParser(prog="gitignore matcher benchmark")
+    agp.add_argument('--paths', type=int, default=100_000)
+    agp.add_argument('--seed', type=int, default=0)
+    args = agp.parse_args()
+
+    paths = generate_paths(args.paths, args.seed)
+    patterns = [p for p in PATTERNS if not p.startswith('#')]
+    rules = IgnoreRules('.', root_patterns=PATTERNS)
+    # The synthetic tree has no nested .gitignore files to look up
+    rules.levels.update({
+        '/'.join(parts[:i]): None
+        for parts in (p.split('/') for p in paths)
+        for i in range(1, len(parts))
+    })
+    tree = build_tree(paths)
+
+    old, old_time = timed(lambda: sum(is_ignored(p, patterns) for p in paths))
+    new, new_time = timed(lambda: sum(rules.is_ignored(p) for p in paths))
+    (checks, kept), walk_time = timed(lambda: pruned_walk(rules, tree))
+
+    print(f"{len(paths)} paths, {len(patterns)} patterns")
+    print(f"{'matcher':<28}{'seconds':>10}{'paths/s':>12}{'ignored':>10}")
+    print(f"{'fnmatch is_ignored':<28}{old_time:>10.3f}{len(paths) / old_time:>12.0f}{old:>10}")
+    print(f"{'IgnoreRules.is_ignored':<28}{new_time:>10.3f}{len(paths) / new_time:>12.0f}{new:>10}")
+    print(f"{'IgnoreRules pruned walk':<28}{walk_time:>10.3f}{len(paths) / walk_time:>12.0f}"
+          f"{len(paths) - kept:>10}")
+    print(f"pruned walk evaluated {checks} entries, speedup over fnmatch "
+          f"{old_time / walk_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+    End to end benchmark: document a synthetic project with `main.py` against
+    the local fake LLM server, and write throughput, peak RSS, request counts
+    and per stage times to JSON so runs can be compared across commits.
+
+    Three scenarios run in order: `cold` documents everything, `noop` runs
+    again with nothing changed, and `warm_cache` drops the knowledge base but
+    keeps the LLM response cache.
+
+    python3 benchmarks/pipeline.py --files 200 --functions 10 --latency 0.05 --output HEAD.json
+    python3 benchmarks/pipeline.py --files 200 --functions 10 --latency 0.05 --compare HEAD.json
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fake_llm_server import FakeLLMServer  # noqa: E402
+from synthetic_repo import generate  # noqa: E402
+from utils.tracing import percentile  # noqa: E402
+
+SCENARIOS = ('cold', 'noop', 'warm_cache')
+
+
+def stage_times(trace_path: str) -> dict[str, dict]:
+    with open(trace_path) as f:
+        events = json.load(f)['traceEvents']
+    stages: dict[str, list[float]] = {}
+    for event in events:
+        if event['ph'] == 'X':
+            stages.setdefault(event['name'], []).append(event['dur'] / 1e6)
+    result = {}
+    for name, durations in sorted(stages.items()):
+        durations.sort()
+        result[name] = {
+            'count': len(durations),
+            'total_s': round(sum(durations), 4),
+            'p50_ms': round(percentile(durations, 50) * 1000, 3),
+            'p95_ms': round(percentile(durations, 95) * 1000, 3),
+        }
+    return result
+
+
+def node_counts(project_dir: str) -> dict[str, int]:
+    db = sqlite3.connect(os.path.join(project_dir, '.thevibebase.sqlite'))
+    try:
+        return dict(db.execute('SELECT node_type, COUNT(*) FROM nodes GROUP BY node_type'))
+    finally:
+        db.close()
+
+
+def run_pipeline(name: str, work_dir: str, server: FakeLLMServer, args) -> dict:
+    project_dir = os.path.join(work_dir, 'project')
+    trace_path = os.path.join(work_dir, f"{name}.trace.json")
+    command = [
+        sys.executable, os.path.join(ROOT, 'main.py'), '--dir', project_dir,
+        '--llm-cache-path', os.path.join(work_dir, 'llm_cache.sqlite'),
+        '--trace', trace_path,
+        '--concurrency', str(args.concurrency),
+        '--batch-tokens', str(args.batch_tokens),
+        '--parse-workers', str(args.parse_workers),
+    ]
+    env = dict(os.environ, OPENAI_BASE_URL=server.base_url, OPENAI_API_KEY='fake')
+    before = dict(server.stats)
+
+    with open(os.path.join(work_dir, f"{name}.log"), 'w') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 reports the peak RSS of this run alone, parse workers included
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"{name} run failed, see {log.name}")
+
+    stats = {key: server.stats[key] - before[key] for key in before}
+    nodes = node_counts(project_dir)
+    return {
+        'wall_s': round(wall, 3),
+        'peak_rss_mb': round(usage.ru_maxrss / 1024, 1),
+        'cpu_s': round(usage.ru_utime + usage.ru_stime, 3),
+        'requests': stats['requests'],
+        'completions': stats['completions'],
+        'errors': stats['errors'],
+        'prompt_tokens': stats['prompt_tokens'],
+        'requests_per_s': round(stats['requests'] / wall, 2),
+        'functions_per_s': round(
+            sum(n for t, n in nodes.items() if t not in ('file', 'directory')) / wall, 2),
+        'nodes': nodes,
+        'stages': stage_times(trace_path),
+    }
+
+
+def git_commit() -> str:
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                            capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else 'unknown'
+
+
+def compare(results: dict, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nchange against {baseline_path} ({baseline['commit']})")
+    if baseline['params'] != results['params']:
+        print("warning: the baseline was run with different parameters")
+    print(f"{'scenario':<12}{'wall':>10}{'peak RSS':>10}{'requests':>10}")
+    for name, run in results['runs'].items():
+        old = baseline['runs'].get(name)
+        if old is None:
+            continue
+        ratios = [run[key] / old[key] - 1 if old[key] else 0.0
+                  for key in ('wall_s', 'peak_rss_mb', 'requests')]
+        print(f"{name:<12}" + ''.join(f"{ratio:>+10.1%}" for ratio in ratios))
+
+
+def main():
+    agp = argparse.ArgumentParser(prog="Pipeline benchmark")
+    agp.add_argument('--files', type=int, default=100)
+    agp.add_argument('--functions', type=int, default=10, help="Functions per file")
+    agp.add_argument('--depth', type=int, default=2)
+    agp.add_argument('--branching', type=int, default=4)
+    agp.add_argument('--seed', type=int, default=0)
+    agp.add_argument('--latency', type=float, default=0.05,
+                     help="Fake LLM seconds per completion")
+    agp.add_argument('--jitter', type=float, default=0.02)
+    agp.add_argument('--error-rate', type=float, default=0.0)
+    agp.add_argument('--concurrency', type=int, default=8)
+    agp.add_argument('--batch-tokens', type=int, default=0)
+    agp.add_argument('--parse-workers', type=int, default=1)
+    agp.add_argument('--output', default='benchmark_results.json')
+    agp.add_argument('--compare', metavar='BASELINE',
+                     help="Results JSON of an earlier run to compare with")
+    agp.add_argument('--keep', action='store_true',
+                     help="Keep the generated project, logs and traces")
+    args = agp.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='vibe-bench-')
+    project_dir = os.path.join(work_dir, 'project')
+    generate(project_dir, args.files, args.functions, args.depth, args.branching, args.seed)
+    server = FakeLLMServer(latency=args.latency, jitter=args.jitter,
+                           error_rate=args.error_rate, seed=args.seed).start()
+
+    results = {
+        'commit': git_commit(),
+        'python': sys.version.split()[0],
+        'params': {k: v for k, v in vars(args).items()
+                   if k not in ('output', 'compare', 'keep')},
+        'runs': {},
+    }
+    try:
+        for name in SCENARIOS:
+            if name == 'warm_cache':
+                for path in glob.glob(os.path.join(project_dir, '.thevibebase.*')):
+                    os.remove(path)
+            results['runs'][name] = run_pipeline(name, work_dir, server, args)
+    finally:
+        server.stop()
+        if args.keep:
+            print(f"Kept {work_dir}")
+        else:
+            shutil.rmtree(work_dir)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    print(f"{'scenario':<12}{'wall s':>10}{'peak MB':>10}{'cpu s':>10}"
+          f"{'requests':>10}{'req/s':>10}{'func/s':>10}")
+    for name, run in results['runs'].items():
+        print(f"{name:<12}{run['wall_s']:>10.2f}{run['peak_rss_mb']:>10.1f}{run['cpu_s']:>10.2f}"
+              f"{run['requests']:>10}{run['requests_per_s']:>10.1f}{run['functions_per_s']:>10.1f}")
+    print(f"Wrote {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
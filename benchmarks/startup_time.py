@@ -0,0 +1,77 @@
+"""
+    Track CLI startup cost: wall time of `main.py --help` and the import time
+    of `main` and its slowest top level imports, from fresh interpreters.
+
+    python3 benchmarks/startup_time.py --runs 10
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def help_time() -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, 'main.py', '--help'], cwd=ROOT,
+                   stdout=subprocess.DEVNULL, check=True)
+    return time.perf_counter() - start
+
+
+def import_times(module: str) -> tuple[int, dict[str, int]]:
+    """
+        Cumulative microseconds of `module` and of each of its direct imports,
+        from python -X importtime
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    # Imports are listed after their own imports, nested ones indented by
+    # two spaces per level
+    children = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name[1:].rstrip()
+        if not name.startswith(' '):
+            if name == module:
+                return int(cumulative), children
+            children = {}
+        elif not name.startswith('   '):
+            children[name.strip()] = int(cumulative)
+    raise RuntimeError(f"{module} was not imported")
+
+
+def main():
+    agp = argparse.ArgumentParser(prog="CLI startup benchmark")
+    agp.add_argument('--runs', type=int, default=10)
+    agp.add_argument('--module', default='main')
+    agp.add_argument('--top', type=int, default=10,
+                     help="Number of slowest imports to list")
+    args = agp.parse_args()
+
+    help_times = [help_time() for _ in range(args.runs)]
+    runs = [import_times(args.module) for _ in range(args.runs)]
+
+    print(f"main.py --help   median {statistics.median(help_times) * 1000:8.1f} ms"
+          f"   min {min(help_times) * 1000:8.1f} ms")
+    total = [run[0] for run in runs]
+    print(f"import {args.module:<9} median {statistics.median(total) / 1000:8.1f} ms"
+          f"   min {min(total) / 1000:8.1f} ms")
+
+    direct = {
+        name: statistics.median(run[1].get(name, 0) for run in runs)
+        for name in runs[0][1]
+    }
+    print(f"\nslowest imports of {args.module} (median cumulative ms)")
+    for name, micros in sorted(direct.items(), key=lambda x: -x[1])[:args.top]:
+        print(f"  {name:<40}{micros / 1000:8.1f}")
+
+
+if __name__ == '__main__':
+    main()
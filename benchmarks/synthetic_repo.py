@@ -0,0 +1,107 @@
+"""
+    Generate a synthetic multi-language project, in the languages of
+    `examples/`, to benchmark the documentation pipeline on a known size.
+    The same arguments always produce the same tree.
+
+    python3 benchmarks/synthetic_repo.py /tmp/synthetic --files 200 --functions 10 --depth 3
+"""
+import argparse
+import os
+import random
+
+# Extension -> (file header, function template), templates get the function
+# index `i` and a seed dependent constant `k` so every function hashes differently
+LANGUAGES = {
+    '.py': ('', '''
+def compute_{i}(values, limit={k}):
+    """Sum the values below the limit"""
+    total = 0
+    for value in values:
+        if value < limit:
+            total += value * {i}
+    return total
+'''),
+    '.js': ('', '''
+function compute{i}(values, limit = {k}) {{
+    let total = 0;
+    for (const value of values) {{
+        if (value < limit) {{
+            total += value * {i};
+        }}
+    }}
+    return total;
+}}
+'''),
+    '.go': ('package main\n', '''
+func Compute{i}(values []int) int {{
+    total := 0
+    for _, value := range values {{
+        if value < {k} {{
+            total += value * {i}
+        }}
+    }}
+    return total
+}}
+'''),
+    '.rs': ('', '''
+fn compute_{i}(values: &[i64]) -> i64 {{
+    values.iter().filter(|v| **v < {k}).map(|v| v * {i}).sum()
+}}
+'''),
+    '.cpp': ('#include <vector>\n', '''
+int compute{i}(const std::vector<int>& values) {{
+    int total = 0;
+    for (int value : values) {{
+        if (value < {k}) {{
+            total += value * {i};
+        }}
+    }}
+    return total;
+}}
+'''),
+}
+
+
+def file_dir(index: int, depth: int, branching: int) -> str:
+    """Spread files evenly over a tree of `depth` levels of `branching` directories"""
+    parts = [f"module{(index // branching ** level) % branching}" for level in range(depth)]
+    return os.path.join(*parts) if parts else ''
+
+
+def generate(root: str, files: int, functions: int, depth: int = 2,
+             branching: int = 4, seed: int = 0) -> dict[str, int]:
+    """Write the project under `root`, returns the number of files per extension"""
+    rng = random.Random(seed)
+    extensions = sorted(LANGUAGES)
+    counts = {ext: 0 for ext in extensions}
+    for index in range(files):
+        ext = extensions[index % len(extensions)]
+        header, template = LANGUAGES[ext]
+        directory = os.path.join(root, file_dir(index, depth, branching))
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file{index}{ext}"), 'w') as f:
+            f.write(header)
+            for i in range(functions):
+                f.write(template.format(i=i, k=rng.randint(1, 10_000)))
+        counts[ext] += 1
+    return counts
+
+
+def main():
+    agp = argparse.ArgumentParser(prog="Synthetic project generator")
+    agp.add_argument('root', help="Directory to generate the project in")
+    agp.add_argument('--files', type=int, default=100)
+    agp.add_argument('--functions', type=int, default=10, help="Functions per file")
+    agp.add_argument('--depth', type=int, default=2, help="Directory levels")
+    agp.add_argument('--branching', type=int, default=4, help="Subdirectories per directory")
+    agp.add_argument('--seed', type=int, default=0)
+    args = agp.parse_args()
+
+    counts = generate(args.root, args.files, args.functions, args.depth,
+                      args.branching, args.seed)
+    print(f"Wrote {sum(counts.values())} files with {args.functions} functions each to {args.root}: "
+          + ', '.join(f"{count} {ext}" for ext, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,154 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
 from textwrap import dedent
-from typing import List
+from typing import List, Optional
 
 import dotenv
 from pydantic import BaseModel
 
-from llms import MEDIUM_MODEL, SMALL_MODEL, OpenAIClient
+from llms import MEDIUM_MODEL, SMALL_MODEL, EstimatedResponse, complete
 
 dotenv.load_dotenv()
 
-client = OpenAIClient()
+
+# Every request starts with the same system message, over the 1024 token
+# minimum that OpenAI compatible providers need to cache a prompt prefix, so
+# all requests of every kind share it. The task of the request and its
+# payload follow in the user message.
+SYSTEM_PROMPT = dedent("""
+    You're an elite software engineer with great knowledge in many programming languages, documenting a codebase.
+    Your answers are stored in a knowledge base of the project and rendered into README files, next to the
+    documentation of the surrounding functions, files and directories. Other engineers, and language models answering
+    questions about the project, read them to find where something is implemented and how the parts fit together.
+
+    Every request starts with a task naming one of the output formats below, followed by its input: the programming
+    language and the function sources or the descriptions to summarize. Lists of descriptions are given as Python
+    lists of strings, each string being the documentation of one function, file or subdirectory written earlier in
+    one of these formats. Follow the task and answer in its format only.
+
+    General rules:
+
+    1. Describe what the code does and why it exists, not how each line works. Prefer the purpose and the effect
+       ("Retries failed requests with exponential backoff") over a paraphrase of the statements ("Loops, sleeps and
+       calls send again").
+    2. Only state what the given input shows. Never invent behaviour, callers, return values or requirements that
+       are not visible in the source or in the descriptions. When something is unclear, describe what is visible.
+    3. Mention side effects a caller must know about: reading or writing files, network calls, database access,
+       global or shared state, mutation of the arguments, spawned threads or processes, and the errors that are
+       raised or returned on purpose.
+    4. Write identifiers, file names and paths exactly as they appear in the input, without quotes or backticks.
+       Do not translate them and do not change their case.
+    5. Be concise. A function description is one or two sentences, an argument description a few words, a file
+       description two to four sentences and a directory description three to six sentences. Avoid being wordy,
+       marketing language and filler such as "This function is responsible for".
+    6. Do not repeat the source code, do not include code blocks, and do not add greetings, explanations of your
+       answer, headings or notes that the format does not ask for. The answer is stored as is.
+    7. Use plain English sentences in the present tense, for example "Parses the configuration file" rather than
+       "This will parse the configuration file" or "Parsed the configuration file".
+    8. Use the vocabulary of the given programming language: methods, traits, interfaces, goroutines, templates,
+       decorators, closures or generators where they apply.
+    9. When a summary is built from descriptions, group related items into components instead of listing every
+       item, and name the most important functions, files or subdirectories so the reader knows where to look.
+    10. Say so when the code is a test, generated, vendored or an example, for instance "Test case checking that
+        expired tokens are rejected" or "Generated protocol buffer bindings for the user service".
+    11. For constructors and methods of classes, structs or similar types, describe what the object holds and how
+        the method changes or uses its state, rather than restating the type name.
+    12. When the input is empty, trivial or not meaningful code, still answer in the requested format with a short
+        description saying what little it contains, instead of refusing or asking for more input.
+
+    Output formats:
+
+    A. Function documentation, for a single function or method:
+
+    * <function name>: <brief description of the function>
+        * arg_1: <short description of arg 1>
+        * arg_2: <short description of arg 2>
+        ...
+
+    List the arguments in declaration order. Leave out the receiver (self, cls, this) and omit the argument list
+    entirely when the function takes no arguments. Describe variadic and keyword arguments by their role. Mention
+    the return value in the description when it is not obvious from the name. For example:
+
+    * load_settings: Reads the YAML settings file and merges it over the built-in defaults.
+        * path: location of the settings file
+        * overrides: values that take precedence over the file
+
+    B. Function batch documentation, for several functions given with numeric ids: a single JSON object mapping
+    every function id, as a string, to the function's documentation in format A, and nothing else. For example:
+
+    {"0": "* parse_args: Parses the command line into an options object.\n    * argv: command line arguments",
+     "1": "* main: Entry point that runs the tool with the parsed options and exits with its status."}
+
+    C. File documentation, summarizing the descriptions of the functions implemented in a file:
+
+    * <filename>: <description of the file in several sentences>
+
+    For example:
+
+    * http_client.py: Wraps the HTTP session used to talk to the billing API. Adds authentication headers,
+      retries idempotent requests on timeouts and converts error responses into typed exceptions.
+
+    D. Partial summary, for one part of the descriptions of a file or a directory that has too many of them to be
+    summarized at once. It is later combined with the summaries of the other parts, so describe only this part:
+
+    * <main components of this part>: <description of this part in several sentences>
+
+    E. Directory summary, summarizing the descriptions of the files and subdirectories of a directory: its overall
+    purpose, its architecture, its main components and its role in the larger codebase:
+
+    * <directory_name>: <description of the directory in several sentences>
+
+    F. Directory README, the same content as format E written as the body of a markdown(.md) README:
+
+    # <directory_name>
+    <description of the directory in several sentences>
+
+    G. Directory summary and README in one answer: a single JSON object with the keys "summary", holding the
+    directory summary in format E, and "readme", holding the README body in format F, and nothing else. For example:
+
+    {"summary": "* storage: Persists the knowledge base in SQLite and JSON files.",
+     "readme": "# storage\nPersists the knowledge base in SQLite and JSON files."}
+    """)
+
+METHOD_TASK = "Task: document the function below in format A."
+
+METHOD_BATCH_TASK = "Task: document every function below in format B."
+
+FILE_TASK = "Task: summarize the function descriptions of the file below in format C."
+
+GROUP_TASK = "Task: summarize this part of the descriptions below in format D."
+
+DIRECTORY_TASK = "Task: summarize the file and subdirectory descriptions of the directory below in format E."
+
+DIRECTORY_README_TASK = ("Task: summarize the file and subdirectory descriptions of the directory below "
+                         "in format G.")
+
+MARKDOWN_DIRECTORY_TASK = ("Task: write the README of the directory below from its file and subdirectory "
+                           "descriptions in format F.")
+
+
+def task_messages(task: str, payload: str) -> list[dict]:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": task + "\n" + payload},
+    ]
+
+
+class ContextBudget:
+    """
+        Token budget for the child descriptions sent in a single file or
+        directory summary request, larger inputs are first summarized in
+        groups by `reduce_descriptions`
+    """
+    tokens: int = 8000
+    concurrency: int = 4
+
+    @classmethod
+    def configure(cls, tokens: int = 8000, concurrency: int = 4):
+        cls.tokens = tokens
+        cls.concurrency = max(1, concurrency)
 
 
 class ParsedFunc(BaseModel):
@@ -18,100 +158,184 @@ class ParsedFunc(BaseModel):
 
 
 def generate_method_documentation(parsed_func: ParsedFunc) -> str:
-    response = client.chat.completions.create(
+    return complete(
+        model=SMALL_MODEL,
+        messages=task_messages(METHOD_TASK, dedent(f"""
+            language: {parsed_func.lang}
+            function name: {parsed_func.name}
+            function source: """) + parsed_func.source + "\n\nformatted documentation: "),
+    )
+
+
+def generate_method_documentation_batch(parsed_funcs: List[ParsedFunc]) -> List[Optional[str]]:
+    """
+        Document several functions of the same file in a single request.
+        Returns one documentation per function, None where the response could
+        not be mapped back so the caller can fall back to single requests.
+    """
+    functions = "\n\n".join(
+        f"function id: {i}\nfunction name: {func.name}\nfunction source: {func.source}"
+        for i, func in enumerate(parsed_funcs)
+    )
+    response = complete(
         model=SMALL_MODEL,
-        messages=[
-            {"role": "system", "content": dedent(f"""
-                You're an elite software engineer with great knowledge in {parsed_func.lang} programming language, you will be given
-                a function name and body and you're tasked with generating a short documentation for it formatted as follows:
-
-                * <function name>: <brief description of the function>
-                    * arg_1: <short description of arg 1>
-                    * arg_2: <short description of arg 2>
-                    ...
-
-                function name: {parsed_func.name}
-                function source: {parsed_func.source}
-                """)},
-            {"role": "user", "content": "formatted documentation: "},
-        ]
+        messages=task_messages(METHOD_BATCH_TASK, f"language: {parsed_funcs[0].lang}\n\n{functions}"
+                                                  "\n\nJSON object of formatted documentations: "),
+        outputs=len(parsed_funcs),
     )
-    return response.choices[0].message.content
+    return parse_batch_response(response, len(parsed_funcs))
+
+
+def parse_batch_response(response: Optional[str], count: int) -> List[Optional[str]]:
+    if isinstance(response, EstimatedResponse):
+        return [response[:len(response) // count]] * count
+    docs = [None] * count
+    if not response or '{' not in response:
+        return docs
+    try:
+        parsed = json.loads(response[response.index('{'):response.rindex('}') + 1])
+    except ValueError:
+        return docs
+    if not isinstance(parsed, dict):
+        return docs
+    for key, doc in parsed.items():
+        try:
+            i = int(key)
+        except ValueError:
+            continue
+        if 0 <= i < count and isinstance(doc, str) and doc.strip():
+            docs[i] = doc
+    return docs
 
 
 def generate_file_documentation(language: str, filename: str, filepath: str, function_descriptions: List[str]) -> str:
-    MAX_SUPPORTED_FUNCTIONS = 100
-    response = client.chat.completions.create(
+    return complete(
         model=MEDIUM_MODEL,
-        messages=[
-            {"role": "system", "content": dedent(f"""
-                You're an elite software engineer with great knowledge in {language} programming language, you are tasked to 
-                thoroughly inspect a list of documentations of functions implemented in a file and then summarizing the functionalities,
-                components or a possible logical unit implemented in that file, your description should give the reader 
-                a fairly concise view of what is going inside the file. Avoid being wordy or writing too long descriptions. 
-                You output format should be as follows:
-
-                * <filename>: <description of the file in several sentences>
-
-                filename: {filename}
-                file path: {filepath}
-                function description list: {function_descriptions[:MAX_SUPPORTED_FUNCTIONS]}"""
-                                                 )},
-            {"role": "user", "content": "formatted file documentation: "},
-        ]
+        messages=task_messages(FILE_TASK, dedent(f"""
+            language: {language}
+            filename: {filename}
+            file path: {filepath}
+            function description list: {function_descriptions}
+
+            formatted file documentation: """)),
     )
-    return response.choices[0].message.content
+
+
+def description_tokens(description: Optional[str]) -> int:
+    return len(description or '') // 4 + 1
+
+
+def group_descriptions(descriptions: List[str], budget: int) -> List[List[str]]:
+    """Split descriptions, in order, into groups of at most `budget` tokens"""
+    groups = []
+    current, size = [], 0
+    for description in descriptions:
+        tokens = description_tokens(description)
+        if current and size + tokens > budget:
+            groups.append(current)
+            current, size = [], 0
+        current.append(description)
+        size += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+def generate_group_summary(language: str, kind: str, name: str, descriptions: List[str]) -> str:
+    return complete(
+        model=MEDIUM_MODEL,
+        messages=task_messages(GROUP_TASK, dedent(f"""
+            language: {language}
+            part of the {kind} in: {name}
+            description list: {descriptions}
+
+            formatted summary: """)),
+    )
+
+
+def reduce_descriptions(language: str, kind: str, name: str, descriptions: List[str]) -> List[str]:
+    """
+        Map-reduce descriptions that do not fit the context budget: groups
+        that fit are summarized in parallel, level after level, until the
+        summaries fit in a single request. The number of levels grows
+        logarithmically with the number of descriptions. Requests in flight
+        stay bounded by the rate limiter's `max_in_flight` whatever the
+        number of pools.
+    """
+    budget = ContextBudget.tokens
+    summarize = partial(generate_group_summary, language, kind, name)
+    while sum(map(description_tokens, descriptions)) > budget:
+        groups = group_descriptions(descriptions, budget)
+        if len(groups) == len(descriptions):
+            # Every description alone is too large, grouping cannot help
+            break
+        # Each group runs in a copy of the caller's context so its usage is
+        # attributed to the same node
+        contexts = [copy_context() for _ in groups]
+        with ThreadPoolExecutor(max_workers=ContextBudget.concurrency) as pool:
+            descriptions = list(pool.map(
+                lambda context, group: context.run(summarize, group), contexts, groups))
+    return descriptions
+
+
+def directory_payload(languages: list[str], directory_path: str, file_descriptions: List[str]) -> str:
+    return dedent(f"""
+        languages: {languages}
+        directory path: {directory_path}
+        file description list: {file_descriptions}
+
+        """)
 
 
 def generate_directory_documentation(languages: list[str], directory_path: str, file_descriptions: List[str]) -> str:
-    MAX_SUPPORTED_FILES = 50
-    response = client.chat.completions.create(
+    return complete(
         model=MEDIUM_MODEL,
-        messages=[
-            {"role": "system", "content": dedent(f"""
-            You're an elite software engineer with great knowledge in {languages} programming language, you are tasked to
-            thoroughly inspect a list of file descriptions from a directory and then summarizing the overall purpose,
-            architecture, and main components implemented in that directory. Your description should give the reader
-            a comprehensive yet concise view of what this directory contains and its role in the larger codebase.
-            Avoid being wordy or writing too long descriptions.
-            Your output format should be as follows:
-            * <directory_name>: <description of the directory in several sentences>
-
-            directory path: {directory_path}
-            file description list: {file_descriptions[:MAX_SUPPORTED_FILES]}"""
-                                                 )},
-            {"role": "user", "content": "formatted directory documentation: "},
-        ]
+        messages=task_messages(DIRECTORY_TASK, directory_payload(languages, directory_path, file_descriptions)
+                               + "formatted directory documentation: "),
     )
-    return response.choices[0].message.content
+
+
+def generate_directory_documentation_with_readme(
+    languages: list[str], directory_path: str, file_descriptions: List[str]
+) -> Optional[tuple[str, str]]:
+    """
+        Generate the directory summary and its markdown README body in a
+        single request. Returns None if the response could not be parsed, the
+        caller then falls back to one request for each.
+    """
+    response = complete(
+        model=MEDIUM_MODEL,
+        messages=task_messages(DIRECTORY_README_TASK, directory_payload(languages, directory_path, file_descriptions)
+                               + "JSON object of directory documentations: "),
+        outputs=2,
+    )
+    return parse_directory_response(response)
+
+
+def parse_directory_response(response: Optional[str]) -> Optional[tuple[str, str]]:
+    if isinstance(response, EstimatedResponse):
+        doc = response[:len(response) // 2]
+        return doc, doc
+    if not response or '{' not in response:
+        return None
+    try:
+        parsed = json.loads(response[response.index('{'):response.rindex('}') + 1])
+    except ValueError:
+        return None
+    if not isinstance(parsed, dict):
+        return None
+    summary, readme = parsed.get('summary'), parsed.get('readme')
+    if not all(isinstance(doc, str) and doc.strip() for doc in (summary, readme)):
+        return None
+    return summary, readme
 
 
 def generate_markdown_directory_documentation(languages: list[str], directory_path: str, file_descriptions: List[str]) -> str:
-    MAX_SUPPORTED_FILES = 50
-    response = client.chat.completions.create(
+    return complete(
         model=MEDIUM_MODEL,
-        messages=[
-            {"role": "system", "content": dedent(f"""
-            You're an elite software engineer with great knowledge in {languages} programming language, you are tasked to
-            thoroughly inspect a list of file descriptions from a directory and then summarizing the overall purpose,
-            architecture, and main components implemented in that directory. Your description should give the reader
-            a comprehensive yet concise view of what this directory contains and its role in the larger codebase.
-            Avoid being wordy or writing too long descriptions.
-            All your outputs will have markdown(.md) format
-            Your output format should be as follows:
-
-            # <directory_name>
-            <description of the directory in several sentences>
-
-
-            -- directory path: 
-            {directory_path}
-            -- file description list: 
-            {file_descriptions[:MAX_SUPPORTED_FILES]}"""
-                                                 )},
-            {"role": "user", "content": "formatted directory documentation: "},
-        ]
+        messages=task_messages(MARKDOWN_DIRECTORY_TASK,
+                               directory_payload(languages, directory_path, file_descriptions)
+                               + "formatted directory documentation: "),
     )
-    return response.choices[0].message.content
     # ## <filename or subdirectory name>
     # <description of file or breif description of the subdirectory>
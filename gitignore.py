@@ -1,5 +1,7 @@
 import fnmatch
 import os
+import re
+from typing import Optional
 
 
 def load_patterns(project_dir) -> list[str]:
@@ -53,12 +55,260 @@ def is_ignored(path: str, patterns: list[str]) -> bool:
     return False
 
 
+# POSIX character classes git accepts in bracket expressions
+POSIX_CLASSES = {
+    'alnum': 'a-zA-Z0-9',
+    'alpha': 'a-zA-Z',
+    'blank': ' \\t',
+    'cntrl': '\\x00-\\x1f\\x7f',
+    'digit': '0-9',
+    'graph': '!-~',
+    'lower': 'a-z',
+    'print': ' -~',
+    'punct': re.escape('!"#$%&\'()*+,-./:;<=>?@[\\]^_`{|}~'),
+    'space': ' \\t\\n\\r\\f\\v',
+    'upper': 'A-Z',
+    'xdigit': '0-9A-Fa-f',
+}
+
+
+def translate_class(pattern: str, i: int) -> tuple[Optional[str], int]:
+    """
+        Translate the bracket expression starting at `pattern[i]`, like git's
+        wildmatch: a ']' first is literal, reversed ranges only match their
+        first character and '/' never matches. Returns the regex and the
+        index of the closing ']', or None for a malformed expression, which
+        makes git ignore the whole pattern.
+    """
+    n = len(pattern)
+    i += 1
+    negated = i < n and pattern[i] in '!^'
+    if negated:
+        i += 1
+    items = []
+    prev = None
+    first = True
+    while True:
+        if i >= n:
+            return None, i
+        c = pattern[i]
+        if c == ']' and not first:
+            break
+        first = False
+        if c == '\\':
+            i += 1
+            if i >= n:
+                return None, i
+            c = pattern[i]
+            items.append(re.escape(c))
+        elif c == '-' and prev is not None and i + 1 < n and pattern[i + 1] != ']':
+            i += 1
+            end = pattern[i]
+            if end == '\\':
+                i += 1
+                if i >= n:
+                    return None, i
+                end = pattern[i]
+            if prev <= end:
+                items.append(f"{re.escape(prev)}-{re.escape(end)}")
+            c = None
+        elif c == '[' and pattern.startswith(':', i + 1):
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                return None, i
+            if end - i >= 3 and pattern[end - 1] == ':':
+                name = pattern[i + 2:end - 1]
+                if name not in POSIX_CLASSES:
+                    return None, i
+                items.append(POSIX_CLASSES[name])
+                i = end
+                c = None
+            else:
+                items.append(re.escape(c))
+        else:
+            items.append(re.escape(c))
+        prev = c
+        i += 1
+
+    body = ''.join(items)
+    if negated:
+        return f"[^/{body}]", i
+    if re.fullmatch(f"[{body}]", '/'):
+        return f"(?!/)[{body}]", i
+    return f"[{body}]", i
+
+
+def translate(pattern: str) -> Optional[str]:
+    """
+        Translate a gitignore glob, without its anchor and trailing slash,
+        to a regex matching paths relative to the .gitignore directory. None
+        for patterns git never matches, e.g. with an unterminated '['.
+    """
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == '*':
+            after_slash = i == 0 or pattern[i - 1] == '/'
+            if pattern.startswith('**', i) and after_slash:
+                if i + 2 == n:
+                    out.append('.*')
+                    i += 2
+                    continue
+                if pattern[i + 2] == '/':
+                    out.append('(?:.*/)?')
+                    i += 3
+                    continue
+            while i + 1 < n and pattern[i + 1] == '*':
+                i += 1
+            out.append('[^/]*')
+        elif c == '?':
+            out.append('[^/]')
+        elif c == '[':
+            regex, i = translate_class(pattern, i)
+            if regex is None:
+                return None
+            out.append(regex)
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return ''.join(out)
+
+
+def parse_rule(line: str) -> Optional[tuple[bool, bool, str]]:
+    """
+        Parse one .gitignore line into (negated, directory only, regex),
+        None for blank lines and comments
+    """
+    line = line.rstrip('\n\r')
+    if not line or line.startswith('#'):
+        return None
+    stripped = line.rstrip(' ')
+    if stripped.endswith('\\') and len(stripped) < len(line):
+        stripped += ' '
+    line = stripped
+
+    negated = line.startswith('!')
+    if negated or line.startswith(('\\!', '\\#')):
+        line = line[1:]
+    dir_only = line.endswith('/')
+    line = line.rstrip('/')
+    if not line:
+        return None
+
+    # A slash anywhere but at the end anchors the pattern to its directory
+    anchored = '/' in line
+    regex = translate(line.lstrip('/'))
+    if regex is None:
+        return None
+    if not anchored:
+        regex = '(?:.*/)?' + regex
+    try:
+        re.compile(regex)
+    except re.error:
+        # Like git, a broken pattern matches nothing instead of failing the walk
+        return None
+    return negated, dir_only, regex
+
+
+class IgnoreLevel:
+    """
+        The rules of a single .gitignore compiled into one regex for
+        directories and one for files. The last matching rule decides, so the
+        rules are tried in reverse order and the first alternative that
+        matches tells whether it was a negation.
+    """
+
+    def __init__(self, rules: list[tuple[bool, bool, str]]):
+        rules = rules[::-1]
+        self.dirs = self.combine(rules)
+        self.files = self.combine([rule for rule in rules if not rule[1]])
+
+    @staticmethod
+    def combine(rules):
+        if not rules:
+            return None, []
+        regex = re.compile('|'.join(f'({regex})' for _, _, regex in rules))
+        return regex, [negated for negated, _, _ in rules]
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """
+            True if ignored, False if re-included by a negation, None if no
+            rule matches
+        """
+        regex, negated = self.dirs if is_dir else self.files
+        if regex is None:
+            return None
+        m = regex.fullmatch(rel_path)
+        if m is None:
+            return None
+        return not negated[m.lastindex - 1]
+
+    @classmethod
+    def from_lines(cls, lines) -> Optional['IgnoreLevel']:
+        rules = [rule for rule in map(parse_rule, lines) if rule is not None]
+        return cls(rules) if rules else None
+
+
+class IgnoreRules:
+    """
+        Compiled .gitignore rules of a project, the root one and nested ones
+        loaded on demand, evaluated on paths relative to the project
+        directory. Deeper .gitignore files take precedence.
+    """
+
+    def __init__(self, project_dir: str, root_patterns: Optional[list[str]] = None):
+        self.project_dir = project_dir
+        self.levels: dict[str, Optional[IgnoreLevel]] = {}
+        if root_patterns is not None:
+            self.levels[''] = IgnoreLevel.from_lines(root_patterns)
+
+    def level(self, rel_dir: str) -> Optional[IgnoreLevel]:
+        if rel_dir not in self.levels:
+            path = os.path.join(self.project_dir, rel_dir, '.gitignore')
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.levels[rel_dir] = IgnoreLevel.from_lines(f)
+            except OSError:
+                self.levels[rel_dir] = None
+        return self.levels[rel_dir]
+
+    def match(self, rel_path: str, is_dir: bool = False) -> bool:
+        """
+            Check a path whose parent directories are known not to be ignored,
+            which is the case while walking a tree and pruning ignored ones
+        """
+        rel_path = rel_path.replace(os.sep, '/')
+        rel_dir = rel_path
+        while rel_dir:
+            rel_dir = rel_dir.rpartition('/')[0]
+            level = self.level(rel_dir)
+            if level is None:
+                continue
+            result = level.match(
+                rel_path[len(rel_dir) + 1:] if rel_dir else rel_path, is_dir)
+            if result is not None:
+                return result
+        return False
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """
+            Check any path relative to the project, a file inside an ignored
+            directory is ignored too
+        """
+        parts = rel_path.replace(os.sep, '/').split('/')
+        for i in range(1, len(parts)):
+            if self.match('/'.join(parts[:i]), is_dir=True):
+                return True
+        return self.match(rel_path, is_dir)
+
+
 if __name__ == "__main__":
 
-    patterns = load_patterns(".")
+    rules = IgnoreRules(".")
 
-    isit = is_ignored(
-        path="deploy/Dockerfile",
-        patterns=patterns
-    )
+    isit = rules.is_ignored("deploy/Dockerfile")
     print(isit)
@@ -1,18 +1,326 @@
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
 from typing import Optional
-from openai import OpenAI
+
+from utils.llm_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES, ResponseCache
+from utils.rate_limiter import RateLimiter, parse_retry_after
+from utils.tracing import Tracer
 
 SMALL_MODEL = "gpt-4.1-nano"
 MEDIUM_MODEL = "gpt-4.1-mini"
 LARGE_MODEL = "gpt-4.1"
 
+DEFAULT_BASE_URL = "https://api.metisai.ir/openai/v1"
+
+# USD per million tokens: input, cached input, output
+MODEL_PRICES = {
+    SMALL_MODEL: (0.10, 0.025, 0.40),
+    MEDIUM_MODEL: (0.40, 0.10, 1.60),
+    LARGE_MODEL: (2.00, 0.50, 8.00),
+}
+# Rough latency model for estimates: seconds to the first token, output tokens per second
+MODEL_SPEEDS = {
+    SMALL_MODEL: (0.5, 150.0),
+    MEDIUM_MODEL: (0.8, 90.0),
+    LARGE_MODEL: (1.0, 50.0),
+}
+# Typical length of a single generated documentation
+TYPICAL_COMPLETION_TOKENS = {
+    SMALL_MODEL: 80,
+    MEDIUM_MODEL: 160,
+    LARGE_MODEL: 160,
+}
+
+
+def request_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> float:
+    prompt_price, cached_price, completion_price = MODEL_PRICES.get(model, MODEL_PRICES[LARGE_MODEL])
+    return ((prompt_tokens - cached_tokens) * prompt_price + cached_tokens * cached_price
+            + completion_tokens * completion_price) / 1_000_000
+
+
+def request_seconds(model: str, completion_tokens: int) -> float:
+    first_token, tokens_per_second = MODEL_SPEEDS.get(model, MODEL_SPEEDS[LARGE_MODEL])
+    return first_token + completion_tokens / tokens_per_second
+
 
 class OpenAIClient:
-    _client: Optional[OpenAI] = None
+    """
+        Shared OpenAI client, created on the first request that is not
+        answered from the cache. openai is imported only then as it is slow
+        to import.
+    """
+    _client = None
 
     def __new__(cls, *args, **kwargs):
         if cls._client:
             return cls._client
+        from openai import OpenAI
         cls._client = OpenAI(
-            base_url="https://api.metisai.ir/openai/v1"
+            base_url=os.environ.get("OPENAI_BASE_URL", DEFAULT_BASE_URL),
+            # Retries are handled by the shared rate limiter in `complete`
+            max_retries=0,
         )
         return cls._client
+
+
+class LLMCache:
+    _cache: Optional[ResponseCache] = None
+    enabled: bool = True
+
+    @classmethod
+    def configure(cls, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                  ttl: Optional[float] = None, enabled: bool = True):
+        cls.enabled = enabled
+        cls._cache = ResponseCache(path, max_bytes, ttl) if enabled else None
+
+    @classmethod
+    def get(cls) -> Optional[ResponseCache]:
+        if cls._cache is None and cls.enabled:
+            cls._cache = ResponseCache()
+        return cls._cache
+
+
+class LLMRateLimiter:
+    _limiter: Optional[RateLimiter] = None
+
+    @classmethod
+    def configure(cls, requests_per_minute: Optional[float] = None,
+                  tokens_per_minute: Optional[float] = None, max_retries: int = 6,
+                  max_in_flight: Optional[int] = None):
+        cls._limiter = RateLimiter(
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            max_retries=max_retries,
+            max_in_flight=max_in_flight,
+        )
+
+    @classmethod
+    def get(cls) -> RateLimiter:
+        if cls._limiter is None:
+            cls._limiter = RateLimiter()
+        return cls._limiter
+
+
+class DeferredRequest(Exception):
+    """Raised instead of calling the API while requests are collected for a batch job"""
+
+    def __init__(self, key: str):
+        super().__init__(f"Request {key} deferred to a batch job")
+        self.key = key
+
+
+class LLMBatch:
+    """
+        Collects cache misses as batch job requests instead of sending them,
+        keyed by their response cache key so results can be fed back into the
+        cache once the batch is done
+    """
+    collecting: bool = False
+    requests: dict[str, dict] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def start(cls):
+        cls.collecting = True
+        cls.requests = {}
+
+    @classmethod
+    def record(cls, key: str, model: str, messages: list[dict]):
+        with cls._lock:
+            cls.requests[key] = {"model": model, "messages": messages}
+
+
+class LLMUsage:
+    """
+        Run metrics: requests answered from the local response cache, and
+        the token usage the provider reported for the others, including the
+        prompt tokens it served from its prefix cache
+    """
+    cache_hits: int = 0
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def record_cache_hit(cls):
+        with cls._lock:
+            cls.cache_hits += 1
+
+    @classmethod
+    def record(cls, prompt_tokens: int, cached_tokens: int, completion_tokens: int):
+        with cls._lock:
+            cls.requests += 1
+            cls.prompt_tokens += prompt_tokens
+            cls.cached_tokens += cached_tokens
+            cls.completion_tokens += completion_tokens
+
+    @classmethod
+    def summary(cls) -> str:
+        cached = cls.cached_tokens / cls.prompt_tokens if cls.prompt_tokens else 0.0
+        return (f"LLM usage: {cls.requests} requests, {cls.cache_hits} answered from cache, "
+                f"{cls.prompt_tokens} prompt tokens ({cached:.0%} cached by the provider), "
+                f"{cls.completion_tokens} completion tokens")
+
+
+class RequestUsage:
+    """Requests, tokens and time spent on behalf of a single scheduler task"""
+    __slots__ = ('requests', 'prompt_tokens', 'cached_tokens', 'completion_tokens', 'seconds')
+
+    def __init__(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+
+    def add(self, prompt_tokens: int, cached_tokens: int, completion_tokens: int, seconds: float):
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens
+        self.cached_tokens += cached_tokens
+        self.completion_tokens += completion_tokens
+        self.seconds += seconds
+
+    def merge(self, other: 'RequestUsage'):
+        for field in self.__slots__:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+
+
+# Usage of the requests made in the current task, set by the document engine
+usage_scope: ContextVar[Optional[RequestUsage]] = ContextVar('usage_scope', default=None)
+
+
+def record_scope_usage(prompt_tokens: int, cached_tokens: int, completion_tokens: int, seconds: float):
+    usage = usage_scope.get()
+    if usage is not None:
+        usage.add(prompt_tokens, cached_tokens, completion_tokens, seconds)
+
+
+class EstimatedResponse(str):
+    """
+        Placeholder of a typical documentation length answered during a dry
+        run, parsers of structured answers accept it as a valid answer
+    """
+
+
+class LLMDryRun:
+    """
+        Counts the requests missing from the cache instead of sending them.
+        Prompt tokens are estimated locally, provider prefix caching is
+        assumed for repeated system messages of at least `min_cached_prefix`
+        tokens and completions get a typical length, so parents are estimated
+        with realistic child descriptions.
+    """
+    active: bool = False
+    min_cached_prefix: int = 1024
+    # model -> [requests, prompt tokens, cached tokens, completion tokens]
+    models: dict[str, list[int]] = {}
+    prefixes: set[str] = set()
+    _lock = threading.Lock()
+
+    @classmethod
+    def start(cls, min_cached_prefix: int = 1024):
+        cls.active = True
+        cls.min_cached_prefix = min_cached_prefix
+        cls.models = {}
+        cls.prefixes = set()
+
+    @classmethod
+    def record(cls, model: str, messages: list[dict], outputs: int = 1) -> EstimatedResponse:
+        prompt_tokens = estimate_tokens(messages)
+        completion_tokens = TYPICAL_COMPLETION_TOKENS.get(model, 160) * outputs
+        prefix = json.dumps(messages[:1])
+        prefix_tokens = len(prefix) // 4
+        with cls._lock:
+            cached_tokens = 0
+            if prefix_tokens >= cls.min_cached_prefix:
+                cached_tokens = prefix_tokens if prefix in cls.prefixes else 0
+                cls.prefixes.add(prefix)
+            totals = cls.models.setdefault(model, [0, 0, 0, 0])
+            for i, value in enumerate((1, prompt_tokens, cached_tokens, completion_tokens)):
+                totals[i] += value
+        record_scope_usage(prompt_tokens, cached_tokens, completion_tokens,
+                           request_seconds(model, completion_tokens))
+        return EstimatedResponse('estimated ' * (completion_tokens * 4 // 10))
+
+
+def estimate_tokens(messages: list[dict]) -> int:
+    """Rough prompt size used for pacing, about four characters per token"""
+    return len(json.dumps(messages)) // 4
+
+
+def complete(model: str, messages: list[dict], outputs: int = 1) -> str:
+    """
+        Run a chat completion, answering from the local response cache when
+        possible. `outputs` is the number of documentations the answer holds,
+        used to estimate its length in dry runs.
+    """
+    cache = LLMCache.get()
+    key = None
+    if cache is not None:
+        key = ResponseCache.key(model, messages)
+        with Tracer.span('llm.cache'):
+            cached = cache.get(key)
+        if cached is not None:
+            LLMUsage.record_cache_hit()
+            return cached
+
+    if LLMBatch.collecting:
+        key = key or ResponseCache.key(model, messages)
+        LLMBatch.record(key, model, messages)
+        raise DeferredRequest(key)
+
+    if LLMDryRun.active:
+        return LLMDryRun.record(model, messages, outputs)
+
+    import openai
+    retryable_errors = (
+        openai.RateLimitError,
+        openai.InternalServerError,
+        openai.APIConnectionError,
+    )
+    limiter = LLMRateLimiter.get()
+    estimated = estimate_tokens(messages)
+    start = time.monotonic()
+    for attempt in range(limiter.max_retries + 1):
+        # Time spent waiting on the client side limits and backoffs
+        with Tracer.span('llm.queue'):
+            limiter.acquire(estimated)
+        try:
+            try:
+                with Tracer.span('llm.request', model=model, attempt=attempt):
+                    response = OpenAIClient().chat.completions.create(
+                        model=model,
+                        messages=messages,
+                    )
+            finally:
+                limiter.release()
+        except retryable_errors as e:
+            if attempt == limiter.max_retries:
+                raise
+            headers = e.response.headers if isinstance(e, openai.APIStatusError) else None
+            with Tracer.span('llm.queue'):
+                limiter.backoff(attempt, parse_retry_after(headers),
+                                rate_limited=isinstance(e, openai.RateLimitError))
+            continue
+        break
+
+    if response.usage is not None:
+        limiter.record_usage(estimated, response.usage.total_tokens)
+        details = getattr(response.usage, 'prompt_tokens_details', None)
+        tokens = (
+            response.usage.prompt_tokens or 0,
+            getattr(details, 'cached_tokens', None) or 0,
+            response.usage.completion_tokens or 0,
+        )
+        LLMUsage.record(*tokens)
+        record_scope_usage(*tokens, time.monotonic() - start)
+    content = response.choices[0].message.content
+    if cache is not None and content:
+        with Tracer.span('llm.cache'):
+            cache.put(key, content)
+    return content
@@ -4,43 +4,21 @@ import sys
 
 import dotenv
 
-import gitignore
-from models import CommonName, ProjectKnowledgeBase
-from utils.directory_parser import parse_dir
-from utils.file_parser import FileParser
-from utils.helper import is_supported_file
-from utils.spinner import Spinner
+from gitignore import IgnoreRules
+from llms import LLMBatch, LLMCache, LLMDryRun, LLMRateLimiter, LLMUsage
+from utils.batch_jobs import read_batch_results, write_batch_requests
+from utils.extractor import default_workers
+from utils.llm_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES
+from utils.scheduler import DEFAULT_CONCURRENCY
+from utils.tracing import Tracer
+from utils.walker import FileIndex
+
+# Kept in sync with models.storage.STORE_FILE_NAMES, which is not imported
+# before the arguments are parsed
+STORE_KINDS = ['json', 'sqlite']
 
 dotenv.load_dotenv()
 
-CONFIG_FILE_NAME = '.thevibebase.json'
-
-
-def generate_file_tree(path, gitignore_patterns: list[str]):
-    ret = []
-
-    try:
-        items = os.listdir(path)
-    except OSError as e:
-        print(f"Error reading directory {path}: {e}")
-        return ret
-
-    for i, item in enumerate(items):
-
-        # Check if this item should be ignored
-        if gitignore.is_ignored(item, gitignore_patterns):
-
-            continue
-
-        item_path = os.path.join(path, item)
-
-        if os.path.isdir(item_path):
-            ret += generate_file_tree(item_path, gitignore_patterns)
-        elif is_supported_file(item_path):
-            ret.append(item_path)
-
-    return ret
-
 
 def run():
     agp = argparse.ArgumentParser(
@@ -87,15 +65,224 @@ def run():
         help="Common names that this project might be refered to with",
     )
 
+    agp.add_argument(
+        '--concurrency',
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Maximum number of LLM requests in flight",
+    )
+
+    agp.add_argument(
+        '--since',
+        metavar='REV',
+        help="Only re-document files changed between REV and HEAD, "
+             "requires an existing knowledge base",
+    )
+
+    agp.add_argument(
+        '--llm-cache-path',
+        default=DEFAULT_CACHE_PATH,
+        help="LLM response cache file, shared between projects",
+    )
+
+    agp.add_argument(
+        '--llm-cache-size',
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help="Maximum LLM response cache size in MB, least recently used "
+             "responses are evicted first",
+    )
+
+    agp.add_argument(
+        '--llm-cache-ttl',
+        type=float,
+        default=None,
+        help="Expire cached LLM responses after this many seconds",
+    )
+
+    agp.add_argument(
+        '--no-llm-cache',
+        dest='no_llm_cache',
+        action='store_true',
+        help="If set, LLM responses are neither read from nor written to the cache",
+    )
+
+    agp.add_argument(
+        '--store',
+        choices=STORE_KINDS,
+        default='sqlite',
+        help="Knowledge base storage backend",
+    )
+
+    agp.add_argument(
+        '--export-json',
+        dest='export_json',
+        action='store_true',
+        help="Also export the knowledge base to .thevibebase.json",
+    )
+
+    agp.add_argument(
+        '--checkpoint-every',
+        type=int,
+        default=50,
+        metavar='N',
+        help="Save the nodes documented so far after every N finished "
+             "nodes, SQLite store only",
+    )
+
+    agp.add_argument(
+        '--checkpoint-interval',
+        type=float,
+        default=30.0,
+        metavar='SECONDS',
+        help="Save the knowledge base at least this often while documenting, "
+             "the JSON store is rewritten whole every time",
+    )
+
+    agp.add_argument(
+        '--requests-per-minute',
+        type=float,
+        default=None,
+        help="Client side limit for LLM requests per minute",
+    )
+
+    agp.add_argument(
+        '--tokens-per-minute',
+        type=float,
+        default=None,
+        help="Client side limit for LLM tokens per minute",
+    )
+
+    agp.add_argument(
+        '--max-retries',
+        type=int,
+        default=6,
+        help="Retries for rate limited or failed LLM requests",
+    )
+
+    agp.add_argument(
+        '--batch-tokens',
+        type=int,
+        default=0,
+        metavar='N',
+        help="Document small functions of a file together in requests of up "
+             "to N source tokens, 0 sends one request per function",
+    )
+
+    agp.add_argument(
+        '--batch-import',
+        metavar='FILE',
+        help="Load a provider batch job results JSONL into the LLM response cache",
+    )
+
+    agp.add_argument(
+        '--batch-export',
+        metavar='FILE',
+        help="Instead of calling the LLM, write the requests that are not "
+             "cached yet as a provider batch job JSONL",
+    )
+
+    agp.add_argument(
+        '--dry-run',
+        dest='dry_run',
+        action='store_true',
+        help="Parse the project and estimate the tokens, cost and wall time of "
+             "the requests that are not cached yet, without calling the LLM "
+             "or saving the knowledge base",
+    )
+
+    agp.add_argument(
+        '--trace',
+        metavar='FILE',
+        help="Time the pipeline stages, write them as Chrome trace event JSON "
+             "to FILE and print percentiles per stage",
+    )
+
+    agp.add_argument(
+        '--context-budget',
+        type=int,
+        default=8000,
+        metavar='TOKENS',
+        help="Largest input, in tokens, of a single file or directory summary, "
+             "more is summarized in parallel groups first",
+    )
+
+    agp.add_argument(
+        '--git-files',
+        dest='git_files',
+        action='store_true',
+        help="List project files with git ls-files instead of walking the "
+             "directory tree, falls back to walking outside a git work tree",
+    )
+
+    agp.add_argument(
+        '--walk-workers',
+        type=int,
+        default=1,
+        metavar='N',
+        help="Threads listing directories in parallel, helps on network filesystems",
+    )
+
+    agp.add_argument(
+        '--parse-workers',
+        type=int,
+        default=default_workers(),
+        metavar='N',
+        help="Processes used to parse source files, defaults to the CPU count",
+    )
+
     args = agp.parse_args()
+    if args.trace:
+        Tracer.start()
+
+    # pydantic, tree-sitter and the generators are slow to import, --help
+    # does not need them
+    from docgen.generators import ContextBudget
+    from models import CommonName, ProjectKnowledgeBase
+    from models.storage import Checkpointer, open_store
+    from utils.doc_engine import generate_docs
+    from utils.file_parser import FileParser
+    from utils.git_diff import apply_changes, drop_missing_nodes, get_changes
+    from utils.helper import is_supported_file
+    from utils.usage import UsageTracker, dry_run_report
+
+    if (args.batch_import or args.batch_export) and args.no_llm_cache:
+        agp.error("--batch-import and --batch-export need the LLM response cache")
+    if args.dry_run and args.batch_export:
+        agp.error("--dry-run and --batch-export cannot be combined")
+
+    LLMCache.configure(
+        path=args.llm_cache_path,
+        max_bytes=args.llm_cache_size * 1024 * 1024,
+        ttl=args.llm_cache_ttl,
+        enabled=not args.no_llm_cache,
+    )
+    if args.batch_import:
+        stored, failed = read_batch_results(args.batch_import, LLMCache.get())
+        print(f"Loaded {stored} batch results, {failed} failed")
+    if args.batch_export:
+        LLMBatch.start()
+    if args.dry_run:
+        LLMDryRun.start()
+    LLMRateLimiter.configure(
+        requests_per_minute=args.requests_per_minute,
+        tokens_per_minute=args.tokens_per_minute,
+        max_retries=args.max_retries,
+        # Group summaries run on their own pools, the limit covers them too
+        max_in_flight=args.concurrency,
+    )
+    ContextBudget.configure(tokens=args.context_budget, concurrency=args.concurrency)
 
     project_dir = os.path.abspath(args.dir)
 
-    project = None
-    if os.path.exists(os.path.join(project_dir, CONFIG_FILE_NAME)):
-        with open(os.path.join(project_dir, CONFIG_FILE_NAME), 'r') as f:
-            project = ProjectKnowledgeBase.model_validate_json(f.read())
-    else:
+    # Dry runs read the knowledge base but leave no store file behind
+    store = open_store(project_dir, args.store, read_only=args.dry_run)
+    with Tracer.span('kb.load'):
+        project = store.load()
+        if project is None and args.store != 'json':
+            # Pick up knowledge bases written before the store was configurable
+            project = open_store(project_dir, 'json').load()
+    if project is None:
         project_name = args.name or os.path.dirname(project_dir)
 
         project = ProjectKnowledgeBase(
@@ -104,31 +291,106 @@ def run():
 
             common_names=[CommonName(type=t, name=n) for t, n in args.cnames],
         )
-    gitignore_patterns = gitignore.load_patterns(project_dir)
-
-    py_files = generate_file_tree(project_dir, gitignore_patterns)
+    ignore_rules = IgnoreRules(project_dir)
+
+    refresh_dirs = None
+    index = None
+    if args.since and project.nodes:
+        changes = get_changes(project_dir, args.since)
+        apply_changes(project, project_dir, changes)
+        refresh_dirs = changes.touched_dirs()
+        paths = {
+            p for p in changes.changed | set(changes.renamed.values())
+            if is_supported_file(p)
+            and not ignore_rules.is_ignored(p)
+            and os.path.isfile(os.path.join(project_dir, p))
+        }
+        # Refreshed directories are listed again, their files that were never
+        # documented (untracked, or added before REV) need parsers too
+        index = FileIndex(project_dir, ignore_rules)
+        for rel_dir in refresh_dirs:
+            listing = index.listing(rel_dir)
+            if listing is None:
+                continue
+            for name in listing[1]:
+                p = os.path.join(rel_dir, name)
+                node = project.nodes.get(f"{project.name}:{p}")
+                if is_supported_file(p) and (node is None or node.content_hash is None):
+                    paths.add(p)
+        py_files = [os.path.join(project_dir, p) for p in paths]
+    else:
+        if args.since:
+            print("No knowledge base found, documenting the whole project")
+        with Tracer.span('walk'):
+            if args.git_files:
+                index = FileIndex.from_git(project_dir, ignore_rules)
+                if index is None:
+                    print("Not a git work tree, walking the directory tree")
+            if index is None:
+                index = FileIndex(project_dir, ignore_rules).walk(args.walk_workers)
+        py_files = [f for f in index.files() if is_supported_file(f)]
+        drop_missing_nodes(project, index)
 
     # s = Spinner("Generating Docs")
 
     if not project_dir.endswith('/'):
         project_dir += '/'
 
-    for f in py_files:
-        parser = FileParser(project, f, project_dir=project_dir)
-
-        parser.analyze_file()
-
-    parse_dir(
-        path=project_dir,
-        project=project,
-        gitignore_patterns=gitignore_patterns,
-        project_dir=project_dir,
-        generate_readme_files=not args.no_readmes,
-    )
-
-    json_output = project.model_dump_json()
-    with open(os.path.join(project_dir, CONFIG_FILE_NAME), 'w') as conf:
-        conf.write(json_output)
+    parsers = [
+        FileParser(project, f, project_dir=project_dir)
+        for f in sorted(py_files)
+    ]
+    checkpoint = None
+    if not args.dry_run:
+        checkpoint = Checkpointer(
+            store, project,
+            every_nodes=args.checkpoint_every,
+            every_seconds=args.checkpoint_interval,
+        )
+    usage = UsageTracker(project)
+    try:
+        generate_docs(
+            project=project,
+            project_dir=project_dir,
+            ignore_rules=ignore_rules,
+            parsers=parsers,
+            concurrency=args.concurrency,
+            generate_readme_files=not args.no_readmes,
+            refresh_dirs=refresh_dirs,
+            checkpoint=checkpoint,
+            batch_tokens=args.batch_tokens,
+            parse_workers=args.parse_workers,
+            index=index,
+            usage=usage,
+        )
+    finally:
+        # Keep whatever finished, a re-run resumes from here
+        if checkpoint is not None:
+            checkpoint.flush()
+        store.close()
+        if args.trace:
+            Tracer.export(args.trace)
+            print(Tracer.summary())
+    if args.dry_run:
+        if usage.tasks:
+            print(dry_run_report(
+                usage, args.concurrency,
+                requests_per_minute=args.requests_per_minute,
+                tokens_per_minute=args.tokens_per_minute,
+            ))
+        return
+    if LLMUsage.requests or LLMUsage.cache_hits:
+        print(LLMUsage.summary())
+
+    if args.batch_export:
+        count = write_batch_requests(args.batch_export, LLMBatch.requests)
+        if count:
+            print(f"Wrote {count} requests to {args.batch_export}, run again "
+                  f"with --batch-import <results> once the batch job is done")
+        else:
+            print("No requests left, the knowledge base is complete")
+    if args.export_json and args.store != 'json' and not args.dry_run:
+        open_store(project_dir, 'json').save(project)
     # s.done()
 
 
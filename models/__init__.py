@@ -1,6 +1,7 @@
+from bisect import bisect_left
 from typing import Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr, field_validator
 
 
 class Node(BaseModel):
@@ -12,6 +13,91 @@ class Node(BaseModel):
     node_type: str
 
     short_doc: Optional[str] = None
+    content_hash: Optional[str] = Field(
+        default=None,
+        description="Hash of the node source, or of its children hashes for files and directories")
+
+    prompt_tokens: Optional[int] = Field(
+        default=None, description="Prompt tokens spent documenting this node in its last run")
+    cached_tokens: Optional[int] = Field(
+        default=None, description="Part of `prompt_tokens` served from the provider prompt cache")
+    completion_tokens: Optional[int] = None
+
+
+NODE_FIELDS = ('gid', 'identifier', 'file', 'path',
+               'node_type', 'short_doc', 'content_hash',
+               'prompt_tokens', 'cached_tokens', 'completion_tokens')
+
+
+class NodeRecord:
+    """
+        Slotted stand-in for `Node` kept in `ProjectKnowledgeBase.nodes` while
+        documenting, without validation or a per-instance dict. `Node`s are
+        only built from records at the persistence and export boundary.
+    """
+    __slots__ = NODE_FIELDS
+
+    def __init__(self, gid: str, identifier: str, file: str, path: str,
+                 node_type: str, short_doc: Optional[str] = None,
+                 content_hash: Optional[str] = None,
+                 prompt_tokens: Optional[int] = None,
+                 cached_tokens: Optional[int] = None,
+                 completion_tokens: Optional[int] = None):
+        self.gid = gid
+        self.identifier = identifier
+        self.file = file
+        self.path = path
+        self.node_type = node_type
+        self.short_doc = short_doc
+        self.content_hash = content_hash
+        self.prompt_tokens = prompt_tokens
+        self.cached_tokens = cached_tokens
+        self.completion_tokens = completion_tokens
+
+    def to_node(self) -> Node:
+        return Node.model_construct(**{f: getattr(self, f) for f in NODE_FIELDS})
+
+    @classmethod
+    def from_node(cls, node: Node) -> 'NodeRecord':
+        return cls(*(getattr(node, f) for f in NODE_FIELDS))
+
+
+class NodeDict(dict):
+    """
+        Nodes by gid, counting the changes to its keys in `version` so
+        indexes over them know when to rebuild
+    """
+    version = 0
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self.version += 1
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.version += 1
+
+    def pop(self, *args):
+        self.version += 1
+        return super().pop(*args)
+
+    def popitem(self):
+        self.version += 1
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.version += 1
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        self.version += 1
+        super().update(*args, **kwargs)
+
+    def clear(self):
+        self.version += 1
+        super().clear()
 
 
 class Relation(BaseModel):
@@ -34,10 +120,73 @@ class ProjectKnowledgeBase(BaseModel):
         default_factory=list,
         description="Common names that this project might be refered to with")
 
+    # Holds `NodeRecord`s while documenting, see `compact` and `export`
     nodes: dict[str, Node] = Field(
-        default_factory=dict,
+        default_factory=NodeDict,
         description="References for nodes and definitions in the project")
     relations: dict[tuple[str, str], Relation] = Field(
         default_factory=dict,
         description="Relations inside this project or references to other projects"
     )
+    usage: dict[str, dict[str, int]] = Field(
+        default_factory=dict,
+        description="Requests and tokens spent per level (function, file, directory) over all runs")
+
+    # (indexed nodes dict, its version, sorted gids, their insertion positions)
+    _gid_index: tuple = PrivateAttr(default=(None, 0, [], []))
+
+    @field_validator('nodes', mode='after')
+    @classmethod
+    def track_nodes(cls, nodes: dict) -> NodeDict:
+        return nodes if isinstance(nodes, NodeDict) else NodeDict(nodes)
+
+    def __setattr__(self, name, value):
+        if name == 'nodes' and not isinstance(value, NodeDict):
+            value = NodeDict(value)
+        super().__setattr__(name, value)
+
+    def gid_index(self) -> tuple[list[str], list[int]]:
+        """
+            Node gids in sorted order with their insertion positions, rebuilt
+            only when gids were added or removed or the nodes dict was replaced
+        """
+        nodes, version, gids, positions = self._gid_index
+        if nodes is not self.nodes or version != self.nodes.version:
+            keys = list(self.nodes)
+            positions = sorted(range(len(keys)), key=keys.__getitem__)
+            gids = [keys[i] for i in positions]
+            self._gid_index = (self.nodes, self.nodes.version, gids, positions)
+        return gids, positions
+
+    def gids_with_prefix(self, prefix: str) -> list[str]:
+        """Gids starting with `prefix` in insertion order, found by bisection"""
+        gids, positions = self.gid_index()
+        start = bisect_left(gids, prefix)
+        end = bisect_left(gids, prefix + '\U0010ffff', start)
+        return [gids[i] for i in sorted(range(start, end), key=positions.__getitem__)]
+
+    def children(self, gid: str) -> list[str]:
+        """Gids nested under a node, such as the functions and methods of a file"""
+        return self.gids_with_prefix(f"{gid}:")
+
+    def add_usage(self, level: str, requests: int, prompt_tokens: int,
+                  cached_tokens: int, completion_tokens: int):
+        totals = self.usage.setdefault(level, {})
+        for key, value in (('requests', requests), ('prompt_tokens', prompt_tokens),
+                           ('cached_tokens', cached_tokens),
+                           ('completion_tokens', completion_tokens)):
+            totals[key] = totals.get(key, 0) + value
+
+    def compact(self):
+        """Replace validated `Node`s, e.g. loaded from JSON, with records"""
+        self.nodes = {
+            gid: NodeRecord.from_node(node) if isinstance(node, Node) else node
+            for gid, node in self.nodes.items()
+        }
+
+    def export(self) -> 'ProjectKnowledgeBase':
+        """Shallow copy whose nodes are all `Node`s, ready to be serialized"""
+        return self.model_copy(update={'nodes': {
+            gid: node.to_node() if isinstance(node, NodeRecord) else node
+            for gid, node in self.nodes.items()
+        }})
@@ -0,0 +1,310 @@
+import json
+import os
+import sqlite3
+import time
+from typing import Optional
+
+from models import (NODE_FIELDS, CommonName, Node, NodeRecord,
+                    ProjectKnowledgeBase, Relation)
+from utils.tracing import Tracer
+
+
+class BaseStore():
+    """
+        Storage backend for a `ProjectKnowledgeBase`. Incremental stores can
+        write a few nodes with `upsert_nodes` without saving everything.
+    """
+    incremental: bool = False
+
+    def exists(self) -> bool:
+        raise NotImplementedError()
+
+    def load(self) -> Optional[ProjectKnowledgeBase]:
+        raise NotImplementedError()
+
+    def save(self, project: ProjectKnowledgeBase):
+        raise NotImplementedError()
+
+    def get_node(self, gid: str) -> Optional[Node]:
+        raise NotImplementedError()
+
+    def nodes_in_file(self, file: str) -> list[Node]:
+        raise NotImplementedError()
+
+    def nodes_with_prefix(self, prefix: str) -> list[Node]:
+        """Nodes whose gid starts with `prefix`, in insertion order"""
+        raise NotImplementedError()
+
+    def upsert_nodes(self, nodes):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class JsonStore(BaseStore):
+    """
+        The whole knowledge base as a single JSON document, every save
+        rewrites the file
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.project: Optional[ProjectKnowledgeBase] = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self) -> Optional[ProjectKnowledgeBase]:
+        if not self.exists():
+            return None
+        with open(self.path, 'r') as f:
+            self.project = ProjectKnowledgeBase.model_validate_json(f.read())
+        self.project.compact()
+        return self.project
+
+    def save(self, project: ProjectKnowledgeBase):
+        self.project = project
+        # Write then rename so a crash never leaves a truncated file behind
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as conf:
+            conf.write(project.export().model_dump_json())
+        os.replace(tmp_path, self.path)
+
+    def get_node(self, gid: str) -> Optional[Node]:
+        node = self.project.nodes.get(gid) if self.project else None
+        return node.to_node() if node is not None else None
+
+    def nodes_in_file(self, file: str) -> list[Node]:
+        if self.project is None:
+            return []
+        return [n.to_node() for n in self.project.nodes.values() if n.file == file]
+
+    def nodes_with_prefix(self, prefix: str) -> list[Node]:
+        if self.project is None:
+            return []
+        return [self.project.nodes[gid].to_node()
+                for gid in self.project.gids_with_prefix(prefix)]
+
+
+class SqliteStore(BaseStore):
+    """
+        Knowledge base stored in SQLite with indexed lookups by gid, file and
+        gid prefix. Saves only write the nodes that changed since the last
+        load or save, in a single transaction.
+
+        A `read_only` store works on an in-memory copy of the file and never
+        creates or changes it.
+    """
+    incremental = True
+
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+        if read_only:
+            self.db = sqlite3.connect(':memory:')
+            if os.path.exists(path):
+                source = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+                source.backup(self.db)
+                source.close()
+        else:
+            self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS nodes (
+                gid TEXT PRIMARY KEY,
+                identifier TEXT,
+                file TEXT,
+                path TEXT,
+                node_type TEXT,
+                short_doc TEXT,
+                content_hash TEXT,
+                prompt_tokens INTEGER,
+                cached_tokens INTEGER,
+                completion_tokens INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS nodes_file ON nodes (file);
+            CREATE TABLE IF NOT EXISTS relations (
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                short_doc TEXT,
+                PRIMARY KEY (source, target)
+            );
+        ''')
+        # Stores created before usage columns existed
+        columns = {row[1] for row in self.db.execute('PRAGMA table_info(nodes)')}
+        for field in ('prompt_tokens', 'cached_tokens', 'completion_tokens'):
+            if field not in columns:
+                self.db.execute(f"ALTER TABLE nodes ADD COLUMN {field} INTEGER")
+        self.db.commit()
+        self.saved_rows: dict[str, tuple] = {}
+
+    @staticmethod
+    def node_row(node: Node) -> tuple:
+        return tuple(getattr(node, field) for field in NODE_FIELDS)
+
+    @staticmethod
+    def row_node(row: tuple) -> Node:
+        return Node.model_construct(**dict(zip(NODE_FIELDS, row)))
+
+    def exists(self) -> bool:
+        return self.db.execute(
+            "SELECT 1 FROM meta WHERE key = 'name'").fetchone() is not None
+
+    def load(self) -> Optional[ProjectKnowledgeBase]:
+        if not self.exists():
+            return None
+        meta = dict(self.db.execute('SELECT key, value FROM meta'))
+        project = ProjectKnowledgeBase(
+            name=meta['name'],
+            description=meta.get('description', ''),
+            common_names=[CommonName(**c)
+                          for c in json.loads(meta.get('common_names', '[]'))],
+            usage=json.loads(meta.get('usage', '{}')),
+        )
+        for row in self.db.execute(f"SELECT {', '.join(NODE_FIELDS)} FROM nodes ORDER BY rowid"):
+            project.nodes[row[0]] = NodeRecord(*row)
+            self.saved_rows[row[0]] = row
+        for source, target, short_doc in self.db.execute(
+                'SELECT source, target, short_doc FROM relations'):
+            project.relations[(source, target)] = Relation(
+                source=source, target=target, short_doc=short_doc)
+        return project
+
+    def save(self, project: ProjectKnowledgeBase):
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', [
+                ('name', project.name),
+                ('description', project.description),
+                ('common_names', json.dumps(
+                    [c.model_dump() for c in project.common_names or []])),
+                ('usage', json.dumps(project.usage)),
+            ])
+            rows = self.write_nodes(project.nodes.values())
+
+            removed = [gid for gid in self.saved_rows if gid not in project.nodes]
+            self.db.executemany(
+                'DELETE FROM nodes WHERE gid = ?', [(gid,) for gid in removed])
+
+            self.db.execute('DELETE FROM relations')
+            self.db.executemany('INSERT INTO relations VALUES (?, ?, ?)', [
+                (r.source, r.target, r.short_doc) for r in project.relations.values()
+            ])
+
+        for gid in removed:
+            del self.saved_rows[gid]
+        self.remember(rows)
+
+    def upsert_nodes(self, nodes):
+        """Write the given nodes that changed since they were last stored"""
+        with self.db:
+            rows = self.write_nodes(nodes)
+        self.remember(rows)
+
+    def write_nodes(self, nodes) -> list[tuple]:
+        rows = []
+        for node in nodes:
+            row = self.node_row(node)
+            if self.saved_rows.get(node.gid) != row:
+                rows.append(row)
+        self.db.executemany(
+            f"INSERT INTO nodes ({', '.join(NODE_FIELDS)}) "
+            f"VALUES ({', '.join('?' * len(NODE_FIELDS))}) "
+            "ON CONFLICT (gid) DO UPDATE SET " +
+            ', '.join(f"{f} = excluded.{f}" for f in NODE_FIELDS[1:]),
+            rows)
+        return rows
+
+    def remember(self, rows: list[tuple]):
+        for row in rows:
+            self.saved_rows[row[0]] = row
+
+    def get_node(self, gid: str) -> Optional[Node]:
+        row = self.db.execute(
+            f"SELECT {', '.join(NODE_FIELDS)} FROM nodes WHERE gid = ?", (gid,)
+        ).fetchone()
+        return self.row_node(row) if row else None
+
+    def nodes_in_file(self, file: str) -> list[Node]:
+        return [self.row_node(row) for row in self.db.execute(
+            f"SELECT {', '.join(NODE_FIELDS)} FROM nodes WHERE file = ? ORDER BY rowid",
+            (file,))]
+
+    def nodes_with_prefix(self, prefix: str) -> list[Node]:
+        # Range scan on the primary key, \U0010ffff sorts after any character.
+        # Insertion order like `JsonStore` and `ProjectKnowledgeBase.children`
+        return [self.row_node(row) for row in self.db.execute(
+            f"SELECT {', '.join(NODE_FIELDS)} FROM nodes "
+            "WHERE gid >= ? AND gid < ? ORDER BY rowid",
+            (prefix, prefix + '\U0010ffff'))]
+
+    def close(self):
+        self.db.close()
+
+
+class Checkpointer():
+    """
+        Periodically writes the nodes documented since the last checkpoint to
+        an incremental store, every `every_nodes` finished tasks or
+        `every_seconds` seconds, whichever comes first. The first checkpoint
+        saves the whole project so the store can be loaded after a crash.
+        Stores that can only be rewritten whole, like JSON, are saved every
+        `every_seconds` seconds only.
+    """
+
+    def __init__(self, store: BaseStore, project: ProjectKnowledgeBase,
+                 every_nodes: int = 50, every_seconds: float = 30.0):
+        self.store = store
+        self.project = project
+        self.every_nodes = every_nodes
+        self.every_seconds = every_seconds
+        self.unsaved = 0
+        self.pending: dict[str, NodeRecord] = {}
+        # An existing store already holds the project meta
+        self.saved = store.exists()
+        self.last_save = time.monotonic()
+
+    def node_done(self, nodes: list[NodeRecord] = ()):
+        self.unsaved += 1
+        if self.store.incremental:
+            for node in nodes:
+                self.pending[node.gid] = node
+            if self.unsaved >= self.every_nodes:
+                self.checkpoint()
+                return
+        if time.monotonic() - self.last_save >= self.every_seconds:
+            self.checkpoint()
+
+    def checkpoint(self):
+        if not self.saved or not self.store.incremental:
+            self.flush()
+            return
+        with Tracer.span('kb.save', nodes=len(self.pending)):
+            self.store.upsert_nodes(self.pending.values())
+        self.reset()
+
+    def flush(self):
+        with Tracer.span('kb.save', nodes=len(self.pending)):
+            self.store.save(self.project)
+        self.saved = True
+        self.reset()
+
+    def reset(self):
+        self.pending = {}
+        self.unsaved = 0
+        self.last_save = time.monotonic()
+
+
+STORE_FILE_NAMES = {
+    'json': '.thevibebase.json',
+    'sqlite': '.thevibebase.sqlite',
+}
+
+
+def open_store(project_dir: str, kind: str = 'sqlite', read_only: bool = False) -> BaseStore:
+    path = os.path.join(project_dir, STORE_FILE_NAMES[kind])
+    if kind == 'json':
+        return JsonStore(path)
+    return SqliteStore(path, read_only=read_only)
@@ -1,27 +1,17 @@
 import os
 import sys
-from utils.file_parser import FileParser
-
 
-def process_file(file_path):
-    """Process a single file and generate documentation"""
-    try:
-        print(f"\n\033[1mProcessing file: {file_path}\033[0m")
-        parser = FileParser(file_path)
-        parser.analyze_file()
-        print(f"\033[92m✓ Successfully processed {file_path}\033[0m")
-        return True
-    except ValueError as e:
-        print(f"\033[93m⚠️ Skipping unsupported file: {file_path} - {str(e)}\033[0m")
-        return False
-    except Exception as e:
-        print(f"\033[91m✗ Error processing {file_path}: {str(e)}\033[0m")
-        return False
+from gitignore import IgnoreRules
+from models import ProjectKnowledgeBase
+from utils.doc_engine import generate_docs
+from utils.file_parser import FileParser
+from utils.helper import is_supported_file
 
 
 def scan_and_process_directory(directory="examples"):
-    """Scan a directory and process all supported language files"""
-    supported_extensions = {'.py', '.js', '.cpp', '.hpp', '.cc', '.cxx', '.go', '.rs'}
+    """Scan a directory and document all supported language files in one run"""
+    project_dir = os.path.join(os.path.abspath(directory), '')
+    project = ProjectKnowledgeBase(name=os.path.basename(os.path.abspath(directory)), description='')
     stats = {
         'total': 0,
         'processed': 0,
@@ -31,22 +21,31 @@ def scan_and_process_directory(directory="examples"):
 
     print(f"\n\033[1m🔍 Scanning directory: {directory}\033[0m")
 
+    parsers = []
     for filename in sorted(os.listdir(directory)):
-        file_path = os.path.join(directory, filename)
+        file_path = os.path.join(project_dir, filename)
         if os.path.isfile(file_path):
             stats['total'] += 1
-            _, ext = os.path.splitext(filename)
-
-            if ext.lower() in supported_extensions:
-                success = process_file(file_path)
-                if success:
-                    stats['processed'] += 1
-                else:
-                    stats['errors'] += 1
+            if is_supported_file(filename):
+                parsers.append(FileParser(project, file_path, project_dir=project_dir))
             else:
                 print(f"\033[93m⚠️ Skipping unsupported file type: {filename}\033[0m")
                 stats['skipped'] += 1
 
+    try:
+        generate_docs(project, project_dir, IgnoreRules(project_dir), parsers,
+                      generate_readme_files=False)
+    except Exception as e:
+        print(f"\033[91m✗ Error documenting {directory}: {str(e)}\033[0m")
+
+    for parser in parsers:
+        if parser.file_ref.short_doc is not None:
+            print(f"\033[92m✓ Successfully processed {parser.path}\033[0m")
+            stats['processed'] += 1
+        else:
+            print(f"\033[91m✗ Error processing {parser.path}\033[0m")
+            stats['errors'] += 1
+
     # Print summary
     print("\n\033[1m📊 Processing Summary:\033[0m")
     print(f"  Total files found:    {stats['total']}")
@@ -0,0 +1,85 @@
+import subprocess
+import warnings
+
+import pytest
+
+from gitignore import IgnoreRules
+
+# (.gitignore contents by directory, paths to check, directories end with '/')
+CASES = {
+    'basename': (
+        {'': '*.log\nbuild\n'},
+        ['a.log', 'src/b.log', 'src/b.log.txt', 'build/', 'src/build', 'lib/build/x.py'],
+    ),
+    'anchored': (
+        {'': '/test_output.txt\n/out/\ndocs/*.md\n'},
+        ['test_output.txt', 'src/test_output.txt', 'out/', 'out/a.py', 'src/out/',
+         'docs/a.md', 'docs/sub/a.md', 'src/docs/a.md'],
+    ),
+    'directory_only': (
+        {'': 'cache/\n'},
+        ['cache/', 'cache/a.py', 'src/cache/', 'lib/cache'],
+    ),
+    'negation': (
+        {'': '*.py\n!keep.py\nlogs/\n!logs/keep.py\n'},
+        ['a.py', 'keep.py', 'src/keep.py', 'logs/', 'logs/keep.py'],
+    ),
+    'double_star': (
+        {'': '**/tmp\na/**/b.py\nvendor/**\n'},
+        ['tmp', 'x/y/tmp', 'a/b.py', 'a/x/b.py', 'a/x/y/b.py', 'b/a/b.py',
+         'vendor/', 'vendor/lib/x.py'],
+    ),
+    'wildcards': (
+        {'': 'f?o.py\nx*y.c\n'},
+        ['foo.py', 'f/o.py', 'fooo.py', 'xy.c', 'xaay.c', 'x/y.c'],
+    ),
+    'nested': (
+        {'': '*.tmp\n', 'sub': '!a.tmp\n/local.py\n', 'sub/deep': 'local.py\n'},
+        ['a.tmp', 'sub/a.tmp', 'sub/b.tmp', 'sub/local.py', 'local.py',
+         'sub/x/local.py', 'sub/deep/local.py'],
+    ),
+    'brackets': (
+        {'': 'foo[z-a].py\nx[[:digit:]].c\ny[!a]z\nq[a-c-e]\nu[]]\nt[!]a]\n'
+             'v[^0-9]\ns[/]k\nr[\\]]\n'},
+        ['foo.py', 'fooz.py', 'fooa.py', 'x1.c', 'xa.c', 'yaz', 'ybz', 'qb', 'qd',
+         'q-', 'qe', 'u]', 'ua', 't]', 'ta', 'tb', 'v1', 'vx', 's/k', 'r]'],
+    ),
+    'malformed_brackets': (
+        {'': 'bar[\nw[[:bogus:]]\nz[[:alpha:]\nok.py\n'},
+        ['bar[', 'bara', 'wb', 'w1', 'za', 'ok.py'],
+    ),
+    'escapes': (
+        {'': '\\#hash\n\\!bang\nspace\\ \n'},
+        ['#hash', '!bang', 'space ', 'space'],
+    ),
+}
+
+
+def git_ignored(root, paths: list[str]) -> set[str]:
+    result = subprocess.run(
+        ['git', '-C', str(root), 'check-ignore', '--no-index', '--stdin'],
+        input='\n'.join(p.rstrip('/') for p in paths), capture_output=True, text=True)
+    assert result.returncode in (0, 1), result.stderr
+    return set(result.stdout.splitlines())
+
+
+@pytest.mark.parametrize('name', CASES)
+def test_matches_git_check_ignore(tmp_path, name):
+    gitignores, paths = CASES[name]
+    subprocess.run(['git', 'init', '-q', str(tmp_path)], check=True)
+    for rel_dir, content in gitignores.items():
+        (tmp_path / rel_dir).mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel_dir / '.gitignore').write_text(content)
+    # git tells directories from files by looking at the tree
+    for path in paths:
+        if path.endswith('/'):
+            (tmp_path / path).mkdir(parents=True, exist_ok=True)
+        else:
+            (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+            (tmp_path / path).touch()
+
+    rules = IgnoreRules(str(tmp_path))
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        ours = {p.rstrip('/') for p in paths if rules.is_ignored(p.rstrip('/'), p.endswith('/'))}
+    assert ours == git_ignored(tmp_path, paths)
@@ -0,0 +1,100 @@
+import os
+import sys
+
+import openai
+import pytest
+
+import main
+from benchmarks.fake_llm_server import FakeLLMServer
+from llms import LLMRateLimiter, OpenAIClient
+from models.storage import open_store
+
+A_PY = '''
+def f(x):
+    return x + 1
+
+
+def g(x):
+    return x * 2
+'''
+
+B_PY = '''
+def h(x):
+    return x - 1
+'''
+
+
+@pytest.fixture
+def server(monkeypatch):
+    fake = FakeLLMServer(port=0).start()
+    monkeypatch.setenv('OPENAI_BASE_URL', fake.base_url)
+    monkeypatch.setenv('OPENAI_API_KEY', 'fake')
+    OpenAIClient._client = None
+    yield fake
+    OpenAIClient._client = None
+    LLMRateLimiter._limiter = None
+    fake.stop()
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch, server):
+    # `document` sets the command line of every run
+    monkeypatch.setattr(sys, 'argv', list(sys.argv))
+    (tmp_path / 'pkg').mkdir()
+    (tmp_path / 'pkg' / 'a.py').write_text(A_PY)
+    (tmp_path / 'pkg' / 'b.py').write_text(B_PY)
+    return tmp_path
+
+
+def document(project_dir, *args):
+    sys.argv = ['main', '--dir', str(project_dir), '--name', 'proj', '--no-llm-cache',
+                '--parse-workers', '1', *args]
+    main.run()
+    return load(project_dir)
+
+
+def load(project_dir):
+    store = open_store(str(project_dir))
+    try:
+        return store.load()
+    finally:
+        store.close()
+
+
+def test_removed_function_is_dropped(project):
+    kb = document(project)
+    f_doc = kb.nodes['proj:pkg/a.py:f'].short_doc
+    assert f_doc in (project / 'pkg' / 'README.md').read_text()
+
+    (project / 'pkg' / 'a.py').write_text(A_PY.replace('def f(x):\n    return x + 1\n', ''))
+    kb = document(project)
+    assert 'proj:pkg/a.py:f' not in kb.nodes
+    assert kb.children('proj:pkg/a.py') == ['proj:pkg/a.py:g']
+    assert f_doc not in (project / 'pkg' / 'README.md').read_text()
+
+
+def test_deleted_file_is_dropped_on_full_runs(project):
+    kb = document(project)
+    assert 'proj:pkg/b.py:h' in kb.nodes
+
+    os.remove(project / 'pkg' / 'b.py')
+    kb = document(project)
+    assert 'proj:pkg/b.py' not in kb.nodes
+    assert 'proj:pkg/b.py:h' not in kb.nodes
+    assert 'proj:pkg/a.py:f' in kb.nodes
+
+
+
+def test_interrupted_run_resumes_after_a_function_is_removed(project, server):
+    server.error_rate = 1.0
+    with pytest.raises(openai.InternalServerError):
+        document(project, '--max-retries', '0')
+    kb = load(project)
+    # Checkpointed placeholders of functions that were never documented
+    assert kb.nodes['proj:pkg/a.py:g'].short_doc is None
+
+    server.error_rate = 0.0
+    (project / 'pkg' / 'a.py').write_text(A_PY.replace('def g(x):\n    return x * 2\n', ''))
+    kb = document(project)
+    assert 'proj:pkg/a.py:g' not in kb.nodes
+    assert all(node.short_doc is not None for node in kb.nodes.values())
@@ -0,0 +1,44 @@
+from models import NodeRecord, ProjectKnowledgeBase
+
+
+def record(gid: str) -> NodeRecord:
+    file = gid.split(':')[1]
+    return NodeRecord(gid=gid, identifier=gid, file=file, path=file, node_type='function')
+
+
+def project_with(*gids: str) -> ProjectKnowledgeBase:
+    project = ProjectKnowledgeBase(name='proj', description='')
+    for gid in gids:
+        project.nodes[gid] = record(gid)
+    return project
+
+
+def test_children_keep_insertion_order():
+    project = project_with('proj:a.py', 'proj:a.py:z', 'proj:a.py:b', 'proj:ab.py:c',
+                           'proj:a.py:m', 'proj:b.py:a')
+    assert project.children('proj:a.py') == ['proj:a.py:z', 'proj:a.py:b', 'proj:a.py:m']
+    assert project.children('proj:b.py') == ['proj:b.py:a']
+
+
+def test_delete_then_insert_rebuilds_the_index():
+    project = project_with('proj:a.py:f', 'proj:a.py:g')
+    assert project.children('proj:a.py') == ['proj:a.py:f', 'proj:a.py:g']
+
+    # Same number of nodes before and after, the index must still notice
+    del project.nodes['proj:a.py:f']
+    project.nodes['proj:a.py:h'] = record('proj:a.py:h')
+    assert project.children('proj:a.py') == ['proj:a.py:g', 'proj:a.py:h']
+
+    project.nodes.pop('proj:a.py:g')
+    project.nodes.setdefault('proj:a.py:i', record('proj:a.py:i'))
+    assert project.children('proj:a.py') == ['proj:a.py:h', 'proj:a.py:i']
+
+
+def test_replacing_the_nodes_dict_rebuilds_the_index():
+    project = project_with('proj:a.py:f', 'proj:a.py:g')
+    assert project.children('proj:a.py') == ['proj:a.py:f', 'proj:a.py:g']
+
+    project.nodes = {'proj:a.py:h': record('proj:a.py:h')}
+    assert project.children('proj:a.py') == ['proj:a.py:h']
+    project.nodes['proj:a.py:i'] = record('proj:a.py:i')
+    assert project.children('proj:a.py') == ['proj:a.py:h', 'proj:a.py:i']
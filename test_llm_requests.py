@@ -0,0 +1,103 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+import pytest
+
+from benchmarks.fake_llm_server import FakeLLMServer
+from llms import LLMCache, LLMRateLimiter, OpenAIClient, complete
+from utils.rate_limiter import RateLimiter
+
+MESSAGES = [{"role": "user", "content": "document this function " + "x" * 400}]
+
+
+@pytest.fixture
+def server(monkeypatch):
+    servers = []
+
+    def start(**kwargs) -> FakeLLMServer:
+        fake = FakeLLMServer(port=0, **kwargs).start()
+        servers.append(fake)
+        monkeypatch.setenv('OPENAI_BASE_URL', fake.base_url)
+        monkeypatch.setenv('OPENAI_API_KEY', 'fake')
+        return fake
+
+    LLMCache.configure(enabled=False)
+    OpenAIClient._client = None
+    yield start
+    OpenAIClient._client = None
+    LLMRateLimiter._limiter = None
+    for fake in servers:
+        fake.stop()
+
+
+def use_limiter(**kwargs) -> RateLimiter:
+    LLMRateLimiter._limiter = RateLimiter(base_delay=0.05, **kwargs)
+    return LLMRateLimiter._limiter
+
+
+def test_retry_after_is_honoured(server):
+    fake = server(rpm=60, retry_after=0.3)
+    limiter = use_limiter()
+
+    complete('fake', MESSAGES)
+    start = time.monotonic()
+    assert complete('fake', MESSAGES)
+    assert fake.stats['rate_limited'] >= 1
+    assert time.monotonic() - start >= 0.3
+    # A rate limit pauses every request, not only the one that hit it
+    assert limiter.blocked_until > start
+
+
+def test_server_errors_are_retried_up_to_max_retries(server):
+    fake = server(error_rate=1.0)
+    limiter = use_limiter(max_retries=2)
+
+    with pytest.raises(openai.InternalServerError):
+        complete('fake', MESSAGES)
+    assert fake.stats['requests'] == 3
+    # Plain server errors only back off the failed request
+    assert limiter.blocked_until == 0.0
+
+
+def test_server_error_then_success(server):
+    fake = server(error_rate=0.5, seed=1)
+    use_limiter(max_retries=10)
+
+    for _ in range(5):
+        assert complete('fake', MESSAGES)
+    assert fake.stats['completions'] == 5
+    assert fake.stats['errors'] > 0
+
+
+def test_requests_per_minute_pacing(server):
+    server()
+    # Ten requests per second, bursts of ten
+    use_limiter(requests_per_minute=600)
+
+    start = time.monotonic()
+    for _ in range(20):
+        complete('fake', MESSAGES)
+    assert time.monotonic() - start >= 0.9
+
+
+def test_tokens_per_minute_pacing(server):
+    server()
+    # About 110 tokens per request, 1000 tokens per second
+    use_limiter(tokens_per_minute=60_000)
+
+    start = time.monotonic()
+    for _ in range(20):
+        complete('fake', MESSAGES)
+    assert time.monotonic() - start >= 0.9
+
+
+def test_requests_in_flight_are_bounded(server):
+    server(latency=0.2)
+    use_limiter(max_in_flight=2)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        assert all(pool.map(lambda _: complete('fake', MESSAGES), range(6)))
+    # Three rounds of two requests
+    assert time.monotonic() - start >= 0.6
@@ -0,0 +1,167 @@
+import sqlite3
+
+import pytest
+
+from models import CommonName, NodeRecord, ProjectKnowledgeBase, Relation
+from models.storage import Checkpointer, JsonStore, SqliteStore, open_store
+
+
+def file_node(project: ProjectKnowledgeBase, path: str, doc=None) -> NodeRecord:
+    node = NodeRecord(gid=f"{project.name}:{path}", identifier=path, file=path,
+                      path=path, node_type='file', short_doc=doc)
+    project.nodes[node.gid] = node
+    return node
+
+
+def test_json_store_is_saved_on_the_checkpoint_timer(tmp_path):
+    store = JsonStore(str(tmp_path / 'kb.json'))
+    project = ProjectKnowledgeBase(name='proj', description='')
+    checkpoint = Checkpointer(store, project, every_nodes=1, every_seconds=3600)
+
+    checkpoint.node_done([file_node(project, 'a.py', 'doc a')])
+    # Rewriting the whole file every node would be quadratic
+    assert not store.exists()
+
+    checkpoint.every_seconds = 0
+    checkpoint.node_done([file_node(project, 'b.py', 'doc b')])
+    assert list(store.load().nodes) == ['proj:a.py', 'proj:b.py']
+
+
+def sample_project() -> ProjectKnowledgeBase:
+    project = ProjectKnowledgeBase(
+        name='proj', description='A project',
+        common_names=[CommonName(type='package', name='proj-lib')],
+        usage={'function': {'requests': 3}},
+    )
+    for gid, node_type in (('proj:b.py', 'file'), ('proj:b.py:z', 'function'),
+                           ('proj:a.py', 'file'), ('proj:a.py:f', 'function'),
+                           ('proj:b.py:a', 'function')):
+        file = gid.split(':')[1]
+        project.nodes[gid] = NodeRecord(
+            gid=gid, identifier=gid, file=file, path=file, node_type=node_type,
+            short_doc=f"doc {gid}", content_hash='hash', prompt_tokens=10,
+            cached_tokens=2, completion_tokens=5)
+    project.relations[('proj:a.py', 'proj:b.py')] = Relation(
+        source='proj:a.py', target='proj:b.py', short_doc='imports')
+    return project
+
+
+def sqlite_load(path) -> ProjectKnowledgeBase:
+    store = SqliteStore(str(path))
+    try:
+        return store.load()
+    finally:
+        store.close()
+
+
+def test_sqlite_round_trip(tmp_path):
+    store = SqliteStore(str(tmp_path / 'kb.sqlite'))
+    assert store.load() is None
+    project = sample_project()
+    store.save(project)
+    store.close()
+
+    loaded = sqlite_load(tmp_path / 'kb.sqlite')
+    assert loaded.name == 'proj'
+    assert loaded.description == 'A project'
+    assert loaded.common_names == project.common_names
+    assert loaded.usage == project.usage
+    assert loaded.relations == project.relations
+    assert list(loaded.nodes) == list(project.nodes)
+    for gid, node in project.nodes.items():
+        assert loaded.nodes[gid].to_node() == node.to_node()
+
+
+def test_sqlite_save_writes_changes_and_deletes_removed_gids(tmp_path):
+    store = SqliteStore(str(tmp_path / 'kb.sqlite'))
+    project = sample_project()
+    store.save(project)
+
+    # Unchanged nodes are not written again
+    changes = store.db.total_changes
+    store.upsert_nodes(project.nodes.values())
+    assert store.db.total_changes == changes
+
+    project.nodes['proj:a.py:f'].short_doc = 'new doc'
+    del project.nodes['proj:b.py:z']
+    store.save(project)
+    store.close()
+
+    loaded = sqlite_load(tmp_path / 'kb.sqlite')
+    assert loaded.nodes['proj:a.py:f'].short_doc == 'new doc'
+    assert 'proj:b.py:z' not in loaded.nodes
+
+
+def test_sqlite_upsert_without_save(tmp_path):
+    store = SqliteStore(str(tmp_path / 'kb.sqlite'))
+    project = sample_project()
+    store.save(project)
+
+    node = project.nodes['proj:a.py:f']
+    node.short_doc = 'upserted'
+    added = NodeRecord(gid='proj:a.py:g', identifier='g', file='a.py', path='g',
+                       node_type='function', short_doc='doc g')
+    project.nodes[added.gid] = added
+    store.upsert_nodes([node, added])
+    store.close()
+
+    loaded = sqlite_load(tmp_path / 'kb.sqlite')
+    assert loaded.nodes['proj:a.py:f'].short_doc == 'upserted'
+    assert loaded.nodes['proj:a.py:g'].short_doc == 'doc g'
+
+
+def test_sqlite_adds_usage_columns_to_old_stores(tmp_path):
+    path = tmp_path / 'kb.sqlite'
+    db = sqlite3.connect(path)
+    db.executescript('''
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE nodes (gid TEXT PRIMARY KEY, identifier TEXT, file TEXT,
+                            path TEXT, node_type TEXT, short_doc TEXT, content_hash TEXT);
+        INSERT INTO meta VALUES ('name', 'proj');
+        INSERT INTO nodes VALUES ('proj:a.py', 'a.py', 'a.py', 'a.py', 'file', 'doc', 'h');
+    ''')
+    db.close()
+
+    node = sqlite_load(path).nodes['proj:a.py']
+    assert node.short_doc == 'doc'
+    assert node.prompt_tokens is None
+
+
+def test_sqlite_read_only_never_writes(tmp_path):
+    path = tmp_path / 'kb.sqlite'
+    store = SqliteStore(str(path), read_only=True)
+    assert store.load() is None
+    store.close()
+    assert not path.exists()
+
+    store = SqliteStore(str(path))
+    store.save(sample_project())
+    store.close()
+    before = path.read_bytes()
+
+    store = SqliteStore(str(path), read_only=True)
+    project = store.load()
+    assert list(project.nodes) == list(sample_project().nodes)
+    project.nodes['proj:a.py:f'].short_doc = 'changed'
+    store.save(project)
+    store.close()
+    assert path.read_bytes() == before
+
+
+@pytest.fixture(params=['json', 'sqlite'])
+def saved_store(request, tmp_path):
+    store = open_store(str(tmp_path), request.param)
+    store.save(sample_project())
+    yield store
+    store.close()
+
+
+def test_lookups(saved_store):
+    assert saved_store.get_node('proj:a.py:f').short_doc == 'doc proj:a.py:f'
+    assert saved_store.get_node('proj:missing') is None
+    assert [n.gid for n in saved_store.nodes_in_file('b.py')] == [
+        'proj:b.py', 'proj:b.py:z', 'proj:b.py:a']
+    # Insertion order in every store
+    assert [n.gid for n in saved_store.nodes_with_prefix('proj:b.py:')] == [
+        'proj:b.py:z', 'proj:b.py:a']
+    assert saved_store.nodes_with_prefix('proj:c.py') == []
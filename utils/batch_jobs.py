@@ -0,0 +1,48 @@
+import json
+
+from utils.llm_cache import ResponseCache
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+def write_batch_requests(path: str, requests: dict[str, dict]) -> int:
+    """
+        Write requests in the provider batch job JSONL format, `custom_id` is
+        the response cache key of the request
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        for key, body in requests.items():
+            f.write(json.dumps({
+                "custom_id": key,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": body,
+            }) + "\n")
+    return len(requests)
+
+
+def read_batch_results(path: str, cache: ResponseCache) -> tuple[int, int]:
+    """
+        Store the successful completions of a batch job results JSONL in the
+        response cache. Returns the number of stored and failed results.
+    """
+    stored = failed = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            try:
+                if result.get("error") or response.get("status_code") != 200:
+                    raise ValueError(result.get("error"))
+                content = response["body"]["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError, ValueError):
+                failed += 1
+                continue
+            if not content:
+                failed += 1
+                continue
+            cache.put(result["custom_id"], content)
+            stored += 1
+    return stored, failed
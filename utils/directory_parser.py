@@ -1,104 +1,154 @@
 
 import os
+from typing import Optional
 
-import gitignore
 from docgen.generators import (generate_directory_documentation,
-                               generate_markdown_directory_documentation)
-from models import Node, ProjectKnowledgeBase
-from utils.helper import get_lang_conf_for_file
-from utils.spinner import Spinner
+                               generate_directory_documentation_with_readme,
+                               generate_markdown_directory_documentation,
+                               reduce_descriptions)
+from gitignore import IgnoreRules
+from llms import DeferredRequest, LLMDryRun
+from models import NodeRecord, ProjectKnowledgeBase
+from utils.helper import get_language
+from utils.tracing import Tracer
+from utils.walker import FileIndex
 
 
-def parse_dir(
+def list_dir(
     path: str, project: ProjectKnowledgeBase,
-    project_dir: str, gitignore_patterns: list[str],
-    generate_readme_files: bool = True
+    project_dir: str, ignore_rules: IgnoreRules,
+    index: Optional[FileIndex] = None,
 ):
-    # print("Generating docs for", path)
-    try:
-        items = os.listdir(path)
-    except OSError as e:
-        print(f"Error reading directory {path}: {e}")
-        return
+    """
+        List the documentable entries of a single directory without recursing.
+        Returns the (gid, name) subsections, the languages used by its files
+        and the full paths of its subdirectories. Listings come from `index`
+        when given, so a tree that was already walked is not read again.
+    """
+    if index is None:
+        index = FileIndex(project_dir, ignore_rules)
+    listing = index.listing(path.replace(project_dir, ''))
+    if listing is None:
+        return None
+    dir_names, file_names = listing
 
     subsections = []
     langs = set()
+    subdirs = []
 
-    for i, item in enumerate(items):
-        if gitignore.is_ignored(item, gitignore_patterns):
+    for item in dir_names:
+        full_path = os.path.join(path, item)
+        subdirs.append(full_path)
+        subsections.append(
+            (f"{project.name}:{full_path.replace(project_dir, '')}", item)
+        )
+    for item in file_names:
+        full_path = os.path.join(path, item)
+        language = get_language(item)
+        if language is None:
             continue
+        langs.add(language.name)
+        subsections.append(
+            (f"{project.name}:{full_path.replace(project_dir, '')}", item)
+        )
 
-        full_path = os.path.join(path, item)
-        if os.path.isdir(full_path):
-            # print("Checking dir", item)
-            parse_dir(
-                path=full_path, project=project, project_dir=project_dir,
-                gitignore_patterns=gitignore_patterns,
-                generate_readme_files=generate_readme_files,
-            )
-            subsections.append(
-                (f"{project.name}:{full_path.replace(project_dir, '')}", item)
-            )
-        else:
-            try:
-                langs.add(get_lang_conf_for_file(full_path)[2])
-                subsections.append(
-                    (f"{project.name}:{full_path.replace(project_dir, '')}", item)
-                )
-            except ValueError as e:
-                pass
+    return subsections, langs, subdirs
 
-    relp = path.replace(project_dir, '')
 
-    s = Spinner(f"Generating docs for {relp} directory ")
-    [print(item) for item, p in subsections]
-    doc = generate_directory_documentation(
-        langs, path,
+def dir_gid(path: str, project: ProjectKnowledgeBase, project_dir: str) -> str:
+    return f"{project.name}:{path.replace(project_dir, '')}"
+
+
+def describe_dir(
+    path: str, project: ProjectKnowledgeBase, project_dir: str,
+    subsections: list[tuple[str, str]], langs: set[str],
+    generate_readme_files: bool = True
+) -> str:
+    """
+        Generate the directory summary and its README, expects every
+        subsection to already be documented in the project
+    """
+    langs = sorted(langs)
+    # A child that could not be documented, e.g. unreadable, is left out
+    subsections = [(item, p) for item, p in subsections
+                   if item in project.nodes and project.nodes[item].short_doc is not None]
+    descriptions = reduce_descriptions(
+        ', '.join(langs), 'files and subdirectories', path,
         [project.nodes[item].short_doc for item, p in subsections]
     )
+    if not generate_readme_files:
+        return generate_directory_documentation(langs, path, descriptions)
 
-    # if relp != '':  # Main project directory, use different function?
-    node = Node(
-        gid=f"{project.name}:{relp}",
-        identifier=relp,
-        file=relp,
-        full_path=relp,
-        path=relp,
-
-        node_type="directory",
-        short_doc=doc,
-    )
-    project.nodes[node.gid] = node
+    docs = generate_directory_documentation_with_readme(langs, path, descriptions)
+    if docs is not None:
+        doc, mddoc = docs
+    else:
+        deferred = None
+        try:
+            doc = generate_directory_documentation(langs, path, descriptions)
+        except DeferredRequest as e:
+            # Collect the README request in the same batch job round
+            deferred = e
+        mddoc = generate_markdown_directory_documentation(langs, path, descriptions)
+        if deferred is not None:
+            raise deferred
+    if LLMDryRun.active:
+        return doc
 
-    if generate_readme_files:
-        mddoc = generate_markdown_directory_documentation(
-            langs, path,
-            [project.nodes[item].short_doc for item, p in subsections]
-        )
-        with open(os.path.join(path, 'README.md'), 'w') as md_file:
-            # print(os.path.join(path, 'README.md'))
-            md_file.write(mddoc)
-
-            for id, p in subsections:
-                if os.path.isdir(p):
-                    file_md = f"## [[{project.nodes[id].path}]] \n"
-                    file_md += project.nodes[id].short_doc
-                    file_md += "\n\n"
-                    md_file.write(file_md)
-                    continue
+    with Tracer.span('readme', dir=path), \
+            open(os.path.join(path, 'README.md'), 'w') as md_file:
+        # print(os.path.join(path, 'README.md'))
+        md_file.write(mddoc)
 
+        for id, p in subsections:
+            if project.nodes[id].node_type == "directory":
                 file_md = f"## [[{project.nodes[id].path}]] \n"
                 file_md += project.nodes[id].short_doc
                 file_md += "\n\n"
-                for key, n in project.nodes.items():
-                    if key == id:
-                        continue
-                    if key.startswith(id):
-                        # file_md += f'* {n.path}\n\n'
-                        v = '\n'.join(
-                            ["\t" + x for x in n.short_doc.split('\n')])
-                        file_md += f'{v}\n\n'
-                file_md += "\n\n"
                 md_file.write(file_md)
+                continue
+
+            file_md = f"## [[{project.nodes[id].path}]] \n"
+            file_md += project.nodes[id].short_doc
+            file_md += "\n\n"
+            for key in project.children(id):
+                n = project.nodes[key]
+                # Reserved by an interrupted run but never documented
+                if n.short_doc is None:
+                    continue
+                # file_md += f'* {n.path}\n\n'
+                v = '\n'.join(
+                    ["\t" + x for x in n.short_doc.split('\n')])
+                file_md += f'{v}\n\n'
+            file_md += "\n\n"
+            md_file.write(file_md)
+
+    return doc
+
+
+def get_dir_node(path: str, project: ProjectKnowledgeBase, project_dir: str) -> NodeRecord:
+    relp = path.replace(project_dir, '')
+
+    # if relp != '':  # Main project directory, use different function?
+    node = project.nodes.get(dir_gid(path, project, project_dir))
+    if node is None:
+        node = NodeRecord(
+            gid=dir_gid(path, project, project_dir),
+            identifier=relp,
+            file=relp,
+            path=relp,
+
+            node_type="directory",
+        )
+        project.nodes[node.gid] = node
+    return node
+
+
+def save_dir_doc(
+    path: str, project: ProjectKnowledgeBase, project_dir: str, doc: str,
+    content_hash: str = None
+):
+    node = get_dir_node(path, project, project_dir)
+    node.short_doc = doc
+    node.content_hash = content_hash
 
-    s.done()
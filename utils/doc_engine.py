@@ -0,0 +1,206 @@
+import os
+from functools import partial
+from typing import Optional
+
+from docgen.generators import (ParsedFunc, generate_method_documentation,
+                               generate_method_documentation_batch)
+from gitignore import IgnoreRules
+from llms import DeferredRequest, estimate_tokens
+from models import ProjectKnowledgeBase
+from models.storage import Checkpointer
+from utils.directory_parser import (describe_dir, get_dir_node, list_dir,
+                                    save_dir_doc)
+from utils.extractor import extract_all
+from utils.file_parser import FileParser, PendingFunc
+from utils.hashing import merkle_hash
+from utils.progress import Progress
+from utils.scheduler import DEFAULT_CONCURRENCY, DagScheduler, Task
+from utils.tracing import Tracer
+from utils.usage import UsageTracker
+from utils.walker import FileIndex
+
+MAX_BATCH_FUNCTIONS = 20
+
+
+def batch_functions(pending: list[PendingFunc], batch_tokens: int) -> list[list[PendingFunc]]:
+    """
+        Pack consecutive functions of a file into batches whose sources fit
+        in `batch_tokens`, functions larger than the budget stay alone
+    """
+    batches = []
+    batch, size = [], 0
+    for func in pending:
+        tokens = estimate_tokens([{"content": func.parsed_func.source}])
+        if batch and (size + tokens > batch_tokens or len(batch) >= MAX_BATCH_FUNCTIONS):
+            batches.append(batch)
+            batch, size = [], 0
+        batch.append(func)
+        size += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def document_functions(parsed_funcs: list[ParsedFunc]) -> list[str]:
+    """Document a batch with one request, falling back to single requests where it failed"""
+    if len(parsed_funcs) == 1:
+        return [generate_method_documentation(parsed_funcs[0])]
+    docs = generate_method_documentation_batch(parsed_funcs)
+    return [
+        doc if doc is not None else generate_method_documentation(func)
+        for func, doc in zip(parsed_funcs, docs)
+    ]
+
+
+def schedule_dir(
+    scheduler: DagScheduler, path: str, project: ProjectKnowledgeBase,
+    project_dir: str, ignore_rules: IgnoreRules,
+    tasks: dict[str, Task], hashes: dict[str, str],
+    usage: UsageTracker,
+    generate_readme_files: bool = True,
+    refresh_dirs: Optional[set[str]] = None,
+    index: Optional[FileIndex] = None
+) -> Optional[str]:
+    """
+        Add the directory and its subdirectories to the scheduler. A directory
+        whose Merkle hash matches the stored one is not re-documented.
+        If `refresh_dirs` is given, only those directories (relative to the
+        project) are visited, the others keep their stored hashes.
+        Returns the directory hash, or None if it could not be listed.
+    """
+    listing = list_dir(path, project, project_dir, ignore_rules, index)
+    if listing is None:
+        return None
+    subsections, langs, subdirs = listing
+
+    for full_path in subdirs:
+        if (refresh_dirs is not None
+                and full_path.replace(project_dir, '') not in refresh_dirs):
+            continue
+        schedule_dir(
+            scheduler, full_path, project, project_dir, ignore_rules,
+            tasks, hashes, usage, generate_readme_files=generate_readme_files,
+            refresh_dirs=refresh_dirs, index=index,
+        )
+
+    def child_hash(gid: str) -> Optional[str]:
+        if gid in hashes:
+            return hashes[gid]
+        node = project.nodes.get(gid)
+        return node.content_hash if node is not None else None
+
+    deps = [tasks[gid] for gid, _ in subsections if gid in tasks]
+    dir_hash = merkle_hash(
+        [path.replace(project_dir, '')] +
+        [f"{name}:{child_hash(gid)}" for gid, name in subsections]
+    )
+
+    node = get_dir_node(path, project, project_dir)
+    hashes[node.gid] = dir_hash
+    if (not deps and node.short_doc is not None
+            and node.content_hash == dir_hash
+            and (not generate_readme_files
+                 or os.path.exists(os.path.join(path, 'README.md')))):
+        return dir_hash
+
+    tasks[node.gid] = usage.add(
+        scheduler, 'directory', [node],
+        partial(describe_dir, path, project, project_dir, subsections, langs,
+                generate_readme_files=generate_readme_files),
+        deps,
+        on_done=partial(save_dir_doc, path, project, project_dir,
+                        content_hash=dir_hash),
+    )
+    return dir_hash
+
+
+def generate_docs(
+    project: ProjectKnowledgeBase, project_dir: str,
+    ignore_rules: IgnoreRules, parsers: list[FileParser],
+    concurrency: int = DEFAULT_CONCURRENCY, generate_readme_files: bool = True,
+    refresh_dirs: Optional[set[str]] = None,
+    checkpoint: Optional[Checkpointer] = None,
+    batch_tokens: int = 0,
+    parse_workers: int = 1,
+    index: Optional[FileIndex] = None,
+    usage: Optional[UsageTracker] = None
+):
+    """
+        Document the whole project as a DAG of functions -> file -> directory
+        -> ... -> project, keeping at most `concurrency` LLM requests in
+        flight. Every summary starts as soon as its own children are done.
+        Nodes are reserved in the project during extraction, so the knowledge
+        base keeps a deterministic order whatever the completion order is.
+
+        Only functions whose source changed and the ancestors whose content
+        hash changed are sent to the LLM. `refresh_dirs` limits the
+        directories that are re-listed, see `schedule_dir`. Finished nodes
+        are reported to `checkpoint` so they survive a crash.
+
+        With a positive `batch_tokens`, small functions of the same file are
+        documented together in requests of about that many source tokens.
+        Files are parsed on `parse_workers` processes before scheduling.
+        Directories are listed from `index` when the tree was already walked.
+        The LLM usage of every node is collected into `usage`.
+    """
+    scheduler = DagScheduler(concurrency)
+    if index is None:
+        index = FileIndex(project_dir, ignore_rules)
+    if usage is None:
+        usage = UsageTracker(project)
+
+    tasks: dict[str, Task] = {}
+    hashes: dict[str, str] = {}
+    records = extract_all([parser.full_path for parser in parsers], parse_workers)
+    for parser, file_records in zip(parsers, records):
+        with Tracer.span('extract', file=parser.path):
+            pending = parser.extract_functions(file_records)
+        if batch_tokens > 0:
+            batches = batch_functions(pending, batch_tokens)
+        else:
+            batches = [[func] for func in pending]
+        func_tasks = [
+            usage.add(
+                scheduler, 'function', [func.node for func in batch],
+                partial(document_functions, [func.parsed_func for func in batch]),
+                on_done=partial(parser.save_method_docs, batch),
+            )
+            for batch in batches
+        ]
+        hashes[parser.file_ref.gid] = parser.content_hash
+        if func_tasks or not parser.is_up_to_date():
+            tasks[parser.file_ref.gid] = usage.add(
+                scheduler, 'file', [parser.file_ref],
+                parser.describe_file, func_tasks, on_done=parser.save_file_doc,
+            )
+    # Collected first, the gid index is only rebuilt once
+    stale = [gid for parser in parsers for gid in parser.stale_children()]
+    for gid in stale:
+        del project.nodes[gid]
+
+    schedule_dir(
+        scheduler, project_dir, project, project_dir, ignore_rules,
+        tasks, hashes, usage, generate_readme_files=generate_readme_files,
+        refresh_dirs=refresh_dirs, index=index,
+    )
+
+    if not scheduler.tasks:
+        print("Everything is up to date")
+        return
+
+    progress = Progress(usage.level_totals())
+
+    def on_task_done(task: Task):
+        progress.task_done(usage.task_levels[task])
+        if checkpoint is not None:
+            checkpoint.node_done(usage.task_nodes[task])
+
+    try:
+        scheduler.run(on_task_done=on_task_done, deferrable=(DeferredRequest,))
+    except BaseException:
+        # The spinner thread would otherwise keep the process alive
+        progress.finish(ok=False)
+        raise
+    progress.finish()
+    if scheduler.deferred:
+        print(f"{scheduler.deferred} nodes are waiting for batch job results")
@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.hashing import content_hash
+from utils.tracing import Tracer
+
+# Below this many files, starting worker processes costs more than it saves
+PARALLEL_MIN_FILES = 32
+
+
+class FuncRecord:
+    """
+        Compact, picklable description of a documentable definition, the
+        source itself stays in the file and is read back only when needed
+    """
+    __slots__ = ('name', 'path', 'node_type', 'start_byte', 'end_byte', 'content_hash')
+
+    def __init__(self, name: str, path: str, node_type: str,
+                 start_byte: int, end_byte: int, content_hash: str):
+        self.name = name
+        self.path = path
+        self.node_type = node_type
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+        self.content_hash = content_hash
+
+
+def extract_records(full_path: str) -> list[FuncRecord]:
+    """Parse a file and return its definitions, runs in worker processes too"""
+    # Imported here so every worker builds its own tree-sitter parsers
+    from utils.helper import get_lang_conf_for_file
+
+    grammar, lang_conf, _ = get_lang_conf_for_file(full_path)
+    parser = grammar.parser()
+    with open(full_path, 'rb') as file:
+        file_bytes = file.read()
+    tree = parser.parse(file_bytes)
+    return [
+        FuncRecord(
+            name=definition.name,
+            path=definition.path,
+            node_type=definition.node.type,
+            start_byte=definition.node.start_byte,
+            end_byte=definition.node.end_byte,
+            content_hash=content_hash(definition.node.text.decode('utf-8')),
+        )
+        for definition in lang_conf.extractDefinitions(parser.language, tree.root_node)
+    ]
+
+
+def extract_timed(full_path: str) -> tuple[list[FuncRecord], float, float, int]:
+    """`extract_records` with its start and end time and the process that ran it"""
+    start = time.monotonic()
+    records = extract_records(full_path)
+    return records, start, time.monotonic(), os.getpid()
+
+
+def extract_all(full_paths: list[str], workers: int = 1) -> list[list[FuncRecord]]:
+    """
+        Extract the definitions of every file, in order, on a pool of
+        `workers` processes for large inputs
+    """
+    # Workers have no tracer of their own, their timings are sent back
+    extract = extract_timed if Tracer.active else extract_records
+    if workers <= 1 or len(full_paths) < PARALLEL_MIN_FILES:
+        results = [extract(path) for path in full_paths]
+    else:
+        # Spawned workers do not inherit the coordinator's threads or parsers
+        context = multiprocessing.get_context('spawn')
+        chunksize = max(1, len(full_paths) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            results = list(pool.map(extract, full_paths, chunksize=chunksize))
+    if not Tracer.active:
+        return results
+
+    for path, (_, start, end, pid) in zip(full_paths, results):
+        Tracer.add('parse', start, end, {'file': path}, pid=pid,
+                   tid=pid if pid != os.getpid() else None)
+    return [records for records, *_ in results]
+
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
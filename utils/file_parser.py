@@ -1,47 +1,54 @@
 import os
-
-import tree_sitter
-from openai import OpenAI
+from typing import Optional
 
 from docgen.generators import (ParsedFunc, generate_file_documentation,
-                               generate_method_documentation)
-from llms import OpenAIClient
-from models import Node, ProjectKnowledgeBase
+                               reduce_descriptions)
+from models import NodeRecord, ProjectKnowledgeBase
+from utils.extractor import FuncRecord, extract_records
+from utils.hashing import merkle_hash
 from utils.helper import get_lang_conf_for_file
 from utils.lang_conf import BaseLangConf
-from utils.spinner import Spinner
+
+
+class PendingFunc:
+    """
+        A function node that was extracted from a file but has no documentation yet
+    """
+
+    def __init__(self, node: NodeRecord, parsed_func: ParsedFunc):
+        self.node = node
+        self.parsed_func = parsed_func
 
 
 class FileParser():
     file = None
     file_bytes: bytes = None
-    tree: tree_sitter.Tree = None
     lang_conf: BaseLangConf = None
     lang: str = 'python'
-    client: OpenAI = None
 
-    file_ref: Node = None
-    nodes: list[Node] = None
+    file_ref: NodeRecord = None
+    nodes: list[NodeRecord] = None
+    pending: list[PendingFunc] = None
+    seen_ids: dict[str, int] = None
+    content_hash: str = None
 
     def __init__(self, project: ProjectKnowledgeBase, path: str, project_dir: str = ""):
         self.project_dir = project_dir
         self.full_path = path
         self.path = path.replace(project_dir, "")
-        self.parser, self.lang_conf, self.lang, = get_lang_conf_for_file(path)
-        self.client = OpenAIClient()
+        _, self.lang_conf, self.lang, = get_lang_conf_for_file(path)
 
         self.project = project
 
         self.nodes = []
-        # TODO: TEMP -> Only generate file_ref config if necessary
-        # Use git diffs later
+        self.pending = []
+        self.seen_ids = {}
         id = f"{project.name}:{self.path}"
         if project.nodes.get(id, None) is None:
-            self.file_ref = Node(
+            self.file_ref = NodeRecord(
                 gid=id,
                 identifier=self.path,
                 file=self.path,
-                full_path=self.path,
                 path=self.path,
 
                 node_type="file",
@@ -50,51 +57,94 @@ class FileParser():
         else:
             self.file_ref = project.nodes[id]
 
-    def analyze_file(self):
-        with open(self.full_path, 'rb') as file:
-            self.file = file
-            self.file_bytes = file.read()
-            self.tree = self.parser.parse(self.file_bytes)
-            self.generate_tags(self.tree.root_node)
-            self.generate_file_doc()
-
-    def generate_method_doc(self, node: tree_sitter.Node):
-        source = node.text.decode('utf-8')
-        id = self.lang_conf.generateIdentifier(
-            self.project, self.path, node)
-        if self.project.nodes.get(id, None) is not None:
-            self.nodes.append(self.project.nodes.get(id))
+    def extract_functions(self, records: Optional[list[FuncRecord]] = None) -> list[PendingFunc]:
+        """
+            Collect every function node that still needs documentation,
+            without calling the LLM. `records` may come from a worker process,
+            otherwise the file is parsed here. The source is released once the
+            pending functions hold their own slices.
+        """
+        if records is None:
+            records = extract_records(self.full_path)
+        for record in records:
+            self.generate_method_doc(record)
+        self.file = None
+        self.file_bytes = None
+        self.seen_ids = {}
+        self.content_hash = merkle_hash(
+            [self.path] + [node.content_hash for node in self.nodes])
+        return self.pending
+
+    def stale_children(self) -> list[str]:
+        """
+            Gids stored under the file that the last `extract_functions` did
+            not produce, e.g. deleted or renamed functions
+        """
+        current = {node.gid for node in self.nodes}
+        return [gid for gid in self.project.children(self.file_ref.gid)
+                if gid not in current]
+
+    def read_source(self, record: FuncRecord) -> str:
+        if self.file_bytes is None:
+            with open(self.full_path, 'rb') as file:
+                self.file = file
+                self.file_bytes = file.read()
+        return self.file_bytes[record.start_byte:record.end_byte].decode('utf-8')
+
+    def is_up_to_date(self) -> bool:
+        """
+            Whether the stored file doc was generated from the same functions,
+            only valid after `extract_functions`
+        """
+        return (self.file_ref.short_doc is not None
+                and self.file_ref.content_hash == self.content_hash)
+
+    def generate_method_doc(self, record: FuncRecord):
+        id = f"{self.project.name}:{self.path}:{record.path}"
+        # Same named scopes (e.g. a Rust struct and its impl) must not
+        # overwrite each other's cached docs
+        self.seen_ids[id] = self.seen_ids.get(id, 0) + 1
+        if self.seen_ids[id] > 1:
+            id = f"{id}#{self.seen_ids[id]}"
+        cached = self.project.nodes.get(id, None)
+        if (cached is not None and cached.short_doc is not None
+                and cached.content_hash == record.content_hash):
+            self.nodes.append(cached)
             return
-        s = Spinner(
-            f"Generating docs for {self.path} -> {self.lang_conf.getMethodName(node)}")
-        doc = generate_method_documentation(ParsedFunc(
-            name=self.lang_conf.getMethodName(node),
-            source=source,
-            lang=self.lang))
-        saved_node = Node(
+        saved_node = NodeRecord(
             gid=id,
-            identifier=self.lang_conf.getMethodName(node),
+            identifier=record.name,
             file=self.path,
-            path=self.lang_conf.generateNodePath(node),
-            node_type=node.type,
-            short_doc=doc
+            path=record.path,
+            node_type=record.node_type,
+            content_hash=record.content_hash,
         )
-
         self.nodes.append(saved_node)
+        # Reserve the slot now so the nodes keep extraction order
         self.project.nodes[saved_node.gid] = saved_node
+        self.pending.append(PendingFunc(saved_node, ParsedFunc(
+            name=record.name,
+            source=self.read_source(record),
+            lang=self.lang)))
 
-        s.done()
+    def save_method_doc(self, pending: PendingFunc, doc: str):
+        pending.node.short_doc = doc
+        # The source is not needed anymore
+        pending.parsed_func = None
 
-    def generate_tags(self, root: tree_sitter.Node):
-        for node in root.children:
-            if self.lang_conf.isDocNeeded(node):
-                self.generate_method_doc(node)
-            self.generate_tags(node)
+    def save_method_docs(self, pending: list[PendingFunc], docs: list[str]):
+        for func, doc in zip(pending, docs):
+            self.save_method_doc(func, doc)
 
-    def generate_file_doc(self):
-        s = Spinner(f"Generating docs for {self.path}")
-        self.file_ref.short_doc = generate_file_documentation(
-            self.lang, os.path.basename(self.full_path), self.path,
+    def save_file_doc(self, doc: str):
+        self.file_ref.short_doc = doc
+        self.file_ref.content_hash = self.content_hash
+
+    def describe_file(self) -> str:
+        descriptions = reduce_descriptions(
+            self.lang, 'functions', self.path,
             [node.short_doc for node in self.nodes]
         )
-        s.done()
+        return generate_file_documentation(
+            self.lang, os.path.basename(self.full_path), self.path, descriptions
+        )
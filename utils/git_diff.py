@@ -0,0 +1,117 @@
+import os
+import subprocess
+
+from models import ProjectKnowledgeBase
+from utils.walker import FileIndex
+
+
+class GitChanges:
+    """
+        Paths changed between two revisions, relative to the project directory
+    """
+
+    def __init__(self):
+        self.changed: set[str] = set()
+        self.deleted: set[str] = set()
+        self.renamed: dict[str, str] = {}
+
+    def touched_paths(self) -> set[str]:
+        return self.changed | self.deleted | set(self.renamed) | set(self.renamed.values())
+
+    def touched_dirs(self) -> set[str]:
+        """All directories that contain a touched path, '' being the project root"""
+        dirs = {''}
+        for path in self.touched_paths():
+            path = os.path.dirname(path)
+            while path:
+                dirs.add(path)
+                path = os.path.dirname(path)
+        return dirs
+
+
+def get_changes(project_dir: str, since: str, until: str = 'HEAD') -> GitChanges:
+    """
+        Read changed, added, deleted and renamed paths between `since` and
+        `until` from the local git repository containing `project_dir`
+    """
+    result = subprocess.run(
+        ['git', '-C', project_dir, 'diff', '--name-status', '-z', '-M',
+         '--relative', since, until],
+        capture_output=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"git diff {since} {until} failed: {result.stderr.decode().strip()}")
+
+    changes = GitChanges()
+    fields = result.stdout.decode('utf-8').split('\0')
+    i = 0
+    while i < len(fields) and fields[i]:
+        status = fields[i][0]
+        if status in ('R', 'C'):
+            old, new = fields[i + 1], fields[i + 2]
+            if status == 'R':
+                changes.renamed[old] = new
+            else:
+                changes.changed.add(new)
+            i += 3
+            continue
+
+        path = fields[i + 1]
+        if status == 'D':
+            changes.deleted.add(path)
+        else:
+            changes.changed.add(path)
+        i += 2
+
+    return changes
+
+
+def move_file_nodes(project: ProjectKnowledgeBase, old: str, new: str):
+    """Carry the cached nodes of a renamed file over to its new path"""
+    old_gid = f"{project.name}:{old}"
+    new_gid = f"{project.name}:{new}"
+
+    nodes = {}
+    for gid, node in project.nodes.items():
+        if node.file == old and (gid == old_gid or gid.startswith(f"{old_gid}:")):
+            gid = new_gid + gid[len(old_gid):]
+            node.gid = gid
+            node.file = new
+            if node.node_type == 'file':
+                node.identifier = new
+                node.path = new
+        nodes[gid] = node
+    project.nodes = nodes
+
+
+def drop_file_nodes(project: ProjectKnowledgeBase, path: str):
+    """Remove a deleted file and its functions from the project"""
+    project.nodes = {
+        gid: node for gid, node in project.nodes.items()
+        if node.file != path
+    }
+
+
+def drop_missing_nodes(project: ProjectKnowledgeBase, index: FileIndex):
+    """
+        Remove the files, with their functions, and directories that are not
+        in a fully walked `index` anymore, e.g. deleted or now ignored
+    """
+    dirs = set(index.dirs)
+    files = {os.path.join(rel_dir, name)
+             for rel_dir, (_, names) in index.dirs.items() for name in names}
+    project.nodes = {
+        gid: node for gid, node in project.nodes.items()
+        if node.file in (dirs if node.node_type == 'directory' else files)
+    }
+
+
+def apply_changes(project: ProjectKnowledgeBase, project_dir: str, changes: GitChanges):
+    for old, new in changes.renamed.items():
+        move_file_nodes(project, old, new)
+    for path in changes.deleted:
+        drop_file_nodes(project, path)
+    for path in changes.touched_dirs():
+        if not os.path.isdir(os.path.join(project_dir, path)):
+            drop_file_nodes(project, path)
@@ -0,0 +1,15 @@
+import hashlib
+
+
+def content_hash(text: str) -> str:
+    """Hash of a node's own source"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def merkle_hash(parts: list[str]) -> str:
+    """Hash of a file or directory, built from the hashes of its children"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or '').encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
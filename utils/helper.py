@@ -1,76 +1,99 @@
+import importlib
 import os
-from typing import Dict, Type
+import threading
+from typing import Dict, Optional, Type
 
 import tree_sitter
-import tree_sitter_cpp
-import tree_sitter_go
-import tree_sitter_javascript
-import tree_sitter_python
-import tree_sitter_rust
 from tree_sitter import Language
 
-from utils.lang_conf import (BaseLangConf, CppLangConf, GoLangConf,
-                             JavaScriptLangConf, PythonLangConf, RustLangConf)
-
-
-def initialize_languages() -> Dict[str, Language]:
-    """Initialize and return all language parsers"""
-    try:
-        languages = {
-            'python': tree_sitter.Parser(Language(tree_sitter_python.language())),
-            'javascript': tree_sitter.Parser(Language(tree_sitter_javascript.language())),
-            'cpp': tree_sitter.Parser(Language(tree_sitter_cpp.language())),
-            'go': tree_sitter.Parser(Language(tree_sitter_go.language())),
-            'rust': tree_sitter.Parser(Language(tree_sitter_rust.language()))
-        }
-        return languages
-    except Exception as e:
-        raise ImportError(
-            "Could not load language parsers. Please install the required packages:\n"
-            "pip install tree-sitter-python tree-sitter-javascript tree-sitter-cpp "
-            "tree-sitter-go tree-sitter-rust"
-        ) from e
-
-
-languages = initialize_languages()
-
-
-def get_lang_conf_for_file(file_path: str) -> Type[BaseLangConf]:
-    """Return the appropriate language configuration class for a file"""
-    _, ext = os.path.splitext(file_path)
-    ext = ext.lower()
-
-    if ext == '.py':
-        return languages['python'], PythonLangConf, 'python',
-    elif ext == '.js':
-        return languages['javascript'], JavaScriptLangConf, 'javascript',
-    elif ext in ['.cpp', '.hpp', '.cc', '.cxx', '.h']:
-        return languages['cpp'], CppLangConf, 'C++',
-    elif ext == '.go':
-        return languages['go'], GoLangConf, 'Go'
-    elif ext == '.rs':
-        return languages['rust'], RustLangConf, 'Rust'
-    else:
-        raise ValueError(f"Unsupported file type: {ext}")
-
-
-def create_parser(file_path: str, language_map: Dict[str, Language]) -> tree_sitter.Parser:
-    """Create and return a configured parser for the given file"""
-    ext = os.path.splitext(file_path)[1].lower()
-    if ext not in language_map:
-        raise ValueError(f"Unsupported file extension: {ext}")
-    return tree_sitter.Parser(language=language_map[ext])
+from utils.lang_conf import (BaseLangConf, CLangConf, CppLangConf,
+                             GoLangConf, JavaLangConf, JavaScriptLangConf,
+                             PythonLangConf, RustLangConf, TsxLangConf,
+                             TypeScriptLangConf)
+
+
+class Grammar:
+    """
+        A tree-sitter grammar, imported and turned into a parser only the
+        first time a file of its language is parsed
+    """
+
+    def __init__(self, module: str, function: str = 'language'):
+        self.module = module
+        self.function = function
+        self._parser: Optional[tree_sitter.Parser] = None
+        self._lock = threading.Lock()
+
+    def parser(self) -> tree_sitter.Parser:
+        with self._lock:
+            if self._parser is None:
+                try:
+                    module = importlib.import_module(self.module)
+                    language = getattr(module, self.function)()
+                except ImportError as e:
+                    raise ImportError(
+                        f"Could not load the {self.module} grammar. Please install it:\n"
+                        f"pip install {self.module.replace('_', '-')}"
+                    ) from e
+                self._parser = tree_sitter.Parser(Language(language))
+            return self._parser
+
+
+class LanguageEntry:
+    """A supported language: its grammar, its configuration and display name"""
+    __slots__ = ('grammar', 'lang_conf', 'name')
+
+    def __init__(self, grammar: Grammar, lang_conf: Type[BaseLangConf], name: str):
+        self.grammar = grammar
+        self.lang_conf = lang_conf
+        self.name = name
+
+
+# extensions, grammar module, grammar function, configuration, display name
+LANGUAGES = [
+    (['.py'], 'tree_sitter_python', 'language', PythonLangConf, 'python'),
+    (['.js', '.jsx', '.mjs', '.cjs'], 'tree_sitter_javascript', 'language',
+     JavaScriptLangConf, 'javascript'),
+    (['.ts', '.mts', '.cts'], 'tree_sitter_typescript', 'language_typescript',
+     TypeScriptLangConf, 'TypeScript'),
+    (['.tsx'], 'tree_sitter_typescript', 'language_tsx', TsxLangConf, 'TypeScript'),
+    (['.cpp', '.hpp', '.cc', '.cxx', '.hh', '.hxx', '.h'], 'tree_sitter_cpp', 'language',
+     CppLangConf, 'C++'),
+    (['.c'], 'tree_sitter_c', 'language', CLangConf, 'C'),
+    (['.go'], 'tree_sitter_go', 'language', GoLangConf, 'Go'),
+    (['.rs'], 'tree_sitter_rust', 'language', RustLangConf, 'Rust'),
+    (['.java'], 'tree_sitter_java', 'language', JavaLangConf, 'Java'),
+]
+
+
+def build_registry(languages) -> Dict[str, LanguageEntry]:
+    registry = {}
+    for extensions, module, function, lang_conf, name in languages:
+        entry = LanguageEntry(Grammar(module, function), lang_conf, name)
+        for ext in extensions:
+            registry[ext] = entry
+    return registry
+
+
+registry = build_registry(LANGUAGES)
+
+
+def get_language(file_path: str) -> Optional[LanguageEntry]:
+    """Registry entry for a file, None if its language is not supported"""
+    return registry.get(os.path.splitext(file_path)[1].lower())
+
+
+def get_lang_conf_for_file(file_path: str):
+    """
+        Return the grammar, the language configuration class and the language
+        name for a file. The grammar is loaded by `Grammar.parser`.
+    """
+    entry = get_language(file_path)
+    if entry is None:
+        raise ValueError(f"Unsupported file type: {os.path.splitext(file_path)[1]}")
+    return entry.grammar, entry.lang_conf, entry.name
 
 
 def is_supported_file(file_path):
-    """Check if file has a supported extension"""
-    supported_extensions = {
-        '.py',  # Python
-        '.cpp', '.h', '.hpp', '.c',  # C/C++
-        '.go',   # Go
-        '.js', '.ts', '.jsx', '.tsx',  # JavaScript/TypeScript
-        '.rs',   # Rust
-        '.java',  # Java
-    }
-    _, ext = os.path.splitext(file_path)
-    return ext.lower() in supported_extensions
+    """Check if the file is in a language that can be parsed"""
+    return get_language(file_path) is not None
@@ -2,236 +2,114 @@ import os
 
 import tree_sitter
 
-from models import ProjectKnowledgeBase
+QUERIES_DIR = os.path.join(os.path.dirname(__file__), 'queries')
 
+compiled_queries: dict[type, tree_sitter.Query] = {}
 
-class BaseLangConf():
-    @classmethod
-    def isDocNeeded(cls, node: tree_sitter.Node):
-        raise NotImplementedError()
-
-    @classmethod
-    def getMethodName(cls, node: tree_sitter.Node):
-        raise NotImplementedError()
-
-    @classmethod
-    def generateIdentifier(cls, project: ProjectKnowledgeBase, node: tree_sitter.Node):
-        raise NotImplementedError()
 
-    @classmethod
-    def isWorthyScope(cls, project: ProjectKnowledgeBase, node: tree_sitter.Node):
-        raise NotImplementedError()
-
-    @classmethod
-    def generateNodePath(cls, node: tree_sitter.Node):
-        raise NotImplementedError()
+class Definition:
+    """
+        A documentable node found by a language query, with its name and its
+        scope path inside the file
+    """
 
+    def __init__(self, node: tree_sitter.Node, name: str, path: str):
+        self.node = node
+        self.name = name
+        self.path = path
 
-class PythonLangConf(BaseLangConf):
-    @classmethod
-    def isDocNeeded(cls, node: tree_sitter.Node):
-        return node.type in ['function_definition', 'class_definition']
 
-    @classmethod
-    def getMethodName(cls, node: tree_sitter.Node):
-        for child in node.children:
-            if child.type == 'identifier':
-                return child.text.decode()
-        return None
+def query_matches(query: tree_sitter.Query, node: tree_sitter.Node):
+    # tree-sitter 0.25 moved query execution to QueryCursor
+    if hasattr(tree_sitter, 'QueryCursor'):
+        return tree_sitter.QueryCursor(query).matches(node)
+    return query.matches(node)
 
-    @classmethod
-    def generateIdentifier(cls, project: ProjectKnowledgeBase, file_path: str, node: tree_sitter.Node):
-        return f"{project.name}:{file_path}:{cls.generateNodePath(node)}"
 
-    @classmethod
-    def isWorthyScope(cls, node: tree_sitter.Node):
-        return node.type == 'function_definition' or node.type == 'class_definition'
+class BaseLangConf():
+    # .scm file in utils/queries capturing @definition nodes and their @name
+    queryFile: str = None
+    scopeSeparator: str = '.'
+
+    @classmethod
+    def getQuery(cls, language: tree_sitter.Language) -> tree_sitter.Query:
+        if cls not in compiled_queries:
+            with open(os.path.join(QUERIES_DIR, cls.queryFile), 'r') as f:
+                compiled_queries[cls] = tree_sitter.Query(language, f.read())
+        return compiled_queries[cls]
+
+    @classmethod
+    def extractDefinitions(cls, language: tree_sitter.Language, root: tree_sitter.Node) -> list[Definition]:
+        """
+            Find every definition that needs documentation in document order,
+            scope paths are built in the same pass with a stack of the
+            enclosing definitions instead of climbing parents
+        """
+        nodes = {}
+        names = {}
+        for _, captures in query_matches(cls.getQuery(language), root):
+            for node in captures.get('definition', []):
+                key = (node.start_byte, node.end_byte, node.type)
+                nodes[key] = node
+                for name in captures.get('name', []):
+                    if key not in names or name.start_byte < names[key].start_byte:
+                        names[key] = name
+
+        definitions = []
+        scopes: list[tuple[int, str]] = []
+        for key in sorted(nodes, key=lambda k: (k[0], -k[1])):
+            node = nodes[key]
+            while scopes and scopes[-1][0] < node.end_byte:
+                scopes.pop()
+            if key not in names:
+                continue
+            name = names[key].text.decode()
+            path = cls.scopeSeparator.join([n for _, n in scopes] + [name])
+            scopes.append((node.end_byte, name))
+            definitions.append(Definition(node, name, path))
+        return definitions
 
-    @classmethod
-    def generateNodePath(cls, node: tree_sitter.Node):
-        sections = []
-        while node:
-            if cls.isWorthyScope(node):
-                sections.append(cls.getMethodName(node))
 
-            node = node.parent
-        return '.'.join(reversed(sections))
+class PythonLangConf(BaseLangConf):
+    queryFile = 'python.scm'
+    scopeSeparator = '.'
 
 
 class JavaScriptLangConf(BaseLangConf):
-    @classmethod
-    def isDocNeeded(cls, node: tree_sitter.Node):
-        return node.type in ['function_declaration', 'method_definition', 'class_declaration']
-
-    @classmethod
-    def getMethodName(cls, node: tree_sitter.Node):
-        if node.type == 'function_declaration':
-            for child in node.children:
-                if child.type == 'identifier':
-                    return child.text.decode()
-        elif node.type == 'method_definition':
-            for child in node.children:
-                if child.type == 'property_identifier':
-                    return child.text.decode()
-        elif node.type == 'class_declaration':
-            for child in node.children:
-                if child.type == 'identifier':
-                    return child.text.decode()
-        return None
-
-    @classmethod
-    def generateIdentifier(cls, project: ProjectKnowledgeBase, file_path: str, node: tree_sitter.Node):
-        return f"{project.name}:{file_path}:{cls.generateNodePath(node)}"
-
-    @classmethod
-    def isWorthyScope(cls, node: tree_sitter.Node):
-        return node.type in ['function_declaration', 'method_definition', 'class_declaration']
-
-    @classmethod
-    def generateNodePath(cls, node: tree_sitter.Node):
-        sections = []
-        while node:
-            if cls.isWorthyScope(node):
-                sections.append(cls.getMethodName(node))
-            node = node.parent
-        return '.'.join(reversed(sections))
+    queryFile = 'javascript.scm'
+    scopeSeparator = '.'
 
 
 class CppLangConf(BaseLangConf):
-    @classmethod
-    def isDocNeeded(cls, node: tree_sitter.Node):
-        return node.type in ['function_definition', 'class_specifier']
-
-    @classmethod
-    def getMethodName(cls, node: tree_sitter.Node):
-        if node.type == 'function_definition':
-            # Look for declarator -> function_declarator -> identifier
-            for child in node.children:
-                if child.type == 'declarator':
-                    for subchild in child.children:
-                        if subchild.type == 'function_declarator':
-                            for id_child in subchild.children:
-                                if id_child.type == 'identifier':
-                                    return id_child.text.decode()
-                elif child.type == 'function_declarator':
-                    for id_child in child.children:
-                        if id_child.type == 'identifier' or id_child.type == 'field_identifier':
-                            return id_child.text.decode()
-        elif node.type == 'class_specifier':
-            for child in node.children:
-                if child.type == 'type_identifier':
-                    return child.text.decode()
-        return None
-
-    @classmethod
-    def generateIdentifier(cls, project: ProjectKnowledgeBase, file_path: str, node: tree_sitter.Node):
-        return f"{project.name}:{file_path}:{cls.generateNodePath(node)}"
-
-    @classmethod
-    def isWorthyScope(cls, node: tree_sitter.Node):
-        return node.type in ['function_definition', 'class_specifier', 'namespace_definition']
-
-    @classmethod
-    def generateNodePath(cls, node: tree_sitter.Node):
-        sections = []
-        while node:
-            if cls.isWorthyScope(node):
-                name = cls.getMethodName(node)
-                if name:  # Only add if we found a name
-                    sections.append(name)
-            node = node.parent
-        return '::'.join(reversed(sections))  # C++ typically uses :: for scope resolution
+    queryFile = 'cpp.scm'
+    scopeSeparator = '::'
 
 
 class GoLangConf(BaseLangConf):
-    @classmethod
-    def isDocNeeded(cls, node: tree_sitter.Node):
-        return node.type in ['function_declaration', 'method_declaration', 'type_declaration']
+    queryFile = 'go.scm'
+    scopeSeparator = '.'
 
-    @classmethod
-    def getMethodName(cls, node: tree_sitter.Node):
-        if node.type in ['function_declaration', 'method_declaration']:
-            for child in node.children:
-                if child.type == 'identifier':
-                    return child.text.decode()
-        elif node.type == 'type_declaration':
-            for child in node.children:
-                if child.type == 'type_spec':
-                    for subchild in child.children:
-                        if subchild.type == 'type_identifier':
-                            return subchild.text.decode()
-        return None
 
-    @classmethod
-    def generateIdentifier(cls, project: ProjectKnowledgeBase, file_path: str, node: tree_sitter.Node):
-        return f"{project.name}:{file_path}:{cls.generateNodePath(node)}"
+class RustLangConf(BaseLangConf):
+    queryFile = 'rust.scm'
+    scopeSeparator = '::'
 
-    @classmethod
-    def isWorthyScope(cls, node: tree_sitter.Node):
-        return node.type in ['function_declaration', 'method_declaration', 'type_declaration']
 
-    @classmethod
-    def generateNodePath(cls, node: tree_sitter.Node):
-        sections = []
-        while node:
-            if cls.isWorthyScope(node):
-                name = cls.getMethodName(node)
-                if name:  # Only add if we found a name
-                    sections.append(name)
-            node = node.parent
-        return '.'.join(reversed(sections))
+class TypeScriptLangConf(BaseLangConf):
+    queryFile = 'typescript.scm'
+    scopeSeparator = '.'
 
 
-class RustLangConf(BaseLangConf):
-    @classmethod
-    def isDocNeeded(cls, node: tree_sitter.Node):
-        return node.type in ['function_item', 'impl_item', 'trait_item', 'struct_item']
+class TsxLangConf(TypeScriptLangConf):
+    # Same query, compiled separately against the tsx grammar
+    pass
 
-    @classmethod
-    def getMethodName(cls, node: tree_sitter.Node):
-        if node.type == 'function_item':
-            for child in node.children:
-                if child.type == 'identifier':
-                    return child.text.decode()
-        elif node.type in ['impl_item', 'trait_item', 'struct_item']:
-            for child in node.children:
-                if child.type == 'type_identifier':
-                    return child.text.decode()
-        return None
 
-    @classmethod
-    def generateIdentifier(cls, project: ProjectKnowledgeBase, file_path: str, node: tree_sitter.Node):
-        return f"{project.name}:{file_path}:{cls.generateNodePath(node)}"
+class JavaLangConf(BaseLangConf):
+    queryFile = 'java.scm'
+    scopeSeparator = '.'
 
-    @classmethod
-    def isWorthyScope(cls, node: tree_sitter.Node):
-        return node.type in ['function_item', 'impl_item', 'trait_item', 'struct_item', 'mod_item']
 
-    @classmethod
-    def generateNodePath(cls, node: tree_sitter.Node):
-        sections = []
-        while node:
-            if cls.isWorthyScope(node):
-                name = cls.getMethodName(node)
-                if name:  # Only add if we found a name
-                    sections.append(name)
-            node = node.parent
-        return '::'.join(reversed(sections))  # Rust uses :: for path separation
-
-
-def get_lang_conf_for_file(file_path):
-    _, ext = os.path.splitext(file_path)
-    ext = ext.lower()
-
-    if ext == '.py':
-        return PythonLangConf
-    elif ext == '.js':
-        return JavaScriptLangConf
-    elif ext in ['.cpp', '.hpp', '.cc', '.cxx']:
-        return CppLangConf
-    elif ext == '.go':
-        return GoLangConf
-    elif ext == '.rs':
-        return RustLangConf
-    else:
-        raise ValueError(f"Unsupported file type: {ext}")
+class CLangConf(BaseLangConf):
+    queryFile = 'c.scm'
+    scopeSeparator = '.'
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'thevibebase', 'llm_responses.sqlite')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# A full cache is shrunk to this share of its size, in batches of rows
+EVICT_TO = 0.9
+EVICT_BATCH = 1000
+
+
+class ResponseCache:
+    """
+        On-disk cache of LLM completions keyed by the model and the full
+        message payload. It is shared by every project, evicts the least
+        recently used responses once `max_bytes` is exceeded and optionally
+        expires entries older than `ttl` seconds.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH,
+                 max_bytes: int = DEFAULT_MAX_BYTES, ttl: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )''')
+        self.db.execute(
+            'CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+        self.db.commit()
+        self.total_bytes = self.db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    @staticmethod
+    def key(model: str, messages: list[dict]) -> str:
+        payload = json.dumps({'model': model, 'messages': messages},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self.lock:
+            row = self.db.execute(
+                'SELECT response, size, created FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            response, size, created = row
+            if self.ttl is not None and created < now - self.ttl:
+                self.db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self.db.commit()
+                self.total_bytes -= size
+                return None
+            self.db.execute(
+                'UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+            self.db.commit()
+            return response
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        with self.lock:
+            old = self.db.execute(
+                'SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                (key, response, size, now, now))
+            self.total_bytes += size - (old[0] if old else 0)
+            self.evict()
+            self.db.commit()
+
+    def evict(self):
+        """
+            Once the cache is full, drop least recently used responses until
+            it is back under `EVICT_TO` of `max_bytes`, so the next puts do
+            not evict again. Expects the lock.
+        """
+        if self.total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * EVICT_TO
+        while self.total_bytes > target:
+            rows = self.db.execute(
+                'SELECT key, size FROM responses ORDER BY last_used LIMIT ?',
+                (EVICT_BATCH,)).fetchall()
+            if not rows:
+                break
+            evicted = []
+            for key, size in rows:
+                if self.total_bytes <= target:
+                    break
+                evicted.append((key,))
+                self.total_bytes -= size
+            self.db.executemany('DELETE FROM responses WHERE key = ?', evicted)
@@ -0,0 +1,82 @@
+import sys
+import time
+from typing import Optional
+
+from yaspin import yaspin
+
+from llms import LLMUsage
+
+LEVEL_NAMES = {'function': 'functions', 'file': 'files', 'directory': 'directories'}
+
+
+def format_duration(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    return f"{minutes}m{seconds:02d}s"
+
+
+class Progress:
+    """
+        One status line for a whole run: finished nodes per level, LLM
+        requests and tokens per second, the share of requests answered from
+        the response cache and the remaining time.
+
+        On a terminal a single spinner is redrawn in place, otherwise, e.g.
+        in CI logs, the status is printed every `interval` seconds.
+    """
+
+    def __init__(self, totals: dict[str, int], interval: float = 10.0, tty: Optional[bool] = None):
+        self.totals = totals
+        self.done = {level: 0 for level in totals}
+        self.interval = interval
+        self.started = time.monotonic()
+        self.last_print = self.started
+        # Usage of the run so far, the counters are process wide
+        self.base = (LLMUsage.requests, LLMUsage.cache_hits,
+                     LLMUsage.prompt_tokens + LLMUsage.completion_tokens)
+
+        self.spinner = None
+        if tty is None:
+            tty = sys.stdout.isatty()
+        if tty:
+            self.spinner = yaspin(text=self.status())
+            self.spinner.start()
+
+    def status(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        requests = LLMUsage.requests - self.base[0]
+        hits = LLMUsage.cache_hits - self.base[1]
+        tokens = LLMUsage.prompt_tokens + LLMUsage.completion_tokens - self.base[2]
+
+        counts = ', '.join(f"{LEVEL_NAMES.get(level, level)} {self.done[level]}/{total}"
+                           for level, total in self.totals.items() if total)
+        finished = sum(self.done.values())
+        remaining = sum(self.totals.values()) - finished
+        eta = format_duration(elapsed / finished * remaining) if finished else '?'
+        cached = hits / (hits + requests) if hits + requests else 0.0
+        return (f"{counts} | {requests / elapsed:.1f} req/s, {tokens / elapsed:.0f} tok/s, "
+                f"{cached:.0%} cached | ETA {eta}")
+
+    def task_done(self, level: str):
+        self.done[level] = self.done.get(level, 0) + 1
+        if self.spinner is not None:
+            self.spinner.text = self.status()
+            return
+        now = time.monotonic()
+        if now - self.last_print >= self.interval:
+            self.last_print = now
+            print(self.status(), flush=True)
+
+    def finish(self, ok: bool = True):
+        elapsed = format_duration(time.monotonic() - self.started)
+        status = f"{self.status().rsplit(' | ETA', 1)[0]} | {elapsed}"
+        if self.spinner is None:
+            print(f"{'Done' if ok else 'Failed'}: {status}", flush=True)
+        elif ok:
+            self.spinner.text = status
+            self.spinner.ok("Done!")
+        else:
+            self.spinner.text = status
+            self.spinner.fail("Failed!")
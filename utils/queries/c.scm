@@ -0,0 +1,16 @@
+; Functions returning values or (nested) pointers
+(function_definition
+  declarator: (function_declarator
+    declarator: (identifier) @name)) @definition
+(function_definition
+  declarator: (pointer_declarator
+    declarator: (function_declarator
+      declarator: (identifier) @name))) @definition
+(function_definition
+  declarator: (pointer_declarator
+    declarator: (pointer_declarator
+      declarator: (function_declarator
+        declarator: (identifier) @name)))) @definition
+(struct_specifier
+  name: (type_identifier) @name
+  body: (field_declaration_list)) @definition
@@ -0,0 +1,27 @@
+; Plain, qualified (out of class, ns::K::f), destructor and operator names,
+; returned directly or through pointers and references
+(function_definition
+  declarator: (function_declarator
+    declarator: [(identifier) (field_identifier) (qualified_identifier)
+                 (destructor_name) (operator_name)] @name)) @definition
+(function_definition
+  declarator: (pointer_declarator
+    declarator: (function_declarator
+      declarator: [(identifier) (field_identifier) (qualified_identifier)
+                   (operator_name)] @name))) @definition
+(function_definition
+  declarator: (pointer_declarator
+    declarator: (pointer_declarator
+      declarator: (function_declarator
+        declarator: [(identifier) (field_identifier) (qualified_identifier)] @name)))) @definition
+(function_definition
+  declarator: (reference_declarator
+    (function_declarator
+      declarator: [(identifier) (field_identifier) (qualified_identifier)
+                   (operator_name)] @name))) @definition
+(function_definition
+  declarator: (pointer_declarator
+    declarator: (reference_declarator
+      (function_declarator
+        declarator: [(identifier) (field_identifier) (qualified_identifier)] @name)))) @definition
+(class_specifier name: (type_identifier) @name) @definition
@@ -0,0 +1,3 @@
+(function_declaration name: (identifier) @name) @definition
+(method_declaration name: (field_identifier) @name) @definition
+(type_declaration (type_spec name: (type_identifier) @name)) @definition
@@ -0,0 +1,6 @@
+(class_declaration name: (identifier) @name) @definition
+(interface_declaration name: (identifier) @name) @definition
+(enum_declaration name: (identifier) @name) @definition
+(record_declaration name: (identifier) @name) @definition
+(method_declaration name: (identifier) @name) @definition
+(constructor_declaration name: (identifier) @name) @definition
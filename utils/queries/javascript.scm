@@ -0,0 +1,3 @@
+(function_declaration name: (identifier) @name) @definition
+(method_definition name: (property_identifier) @name) @definition
+(class_declaration name: (identifier) @name) @definition
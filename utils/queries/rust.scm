@@ -0,0 +1,4 @@
+(function_item name: (identifier) @name) @definition
+(impl_item (type_identifier) @name) @definition
+(trait_item name: (type_identifier) @name) @definition
+(struct_item name: (type_identifier) @name) @definition
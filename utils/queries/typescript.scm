@@ -0,0 +1,5 @@
+(function_declaration name: (identifier) @name) @definition
+(method_definition name: (property_identifier) @name) @definition
+(class_declaration name: (type_identifier) @name) @definition
+(abstract_class_declaration name: (type_identifier) @name) @definition
+(interface_declaration name: (type_identifier) @name) @definition
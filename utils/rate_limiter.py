@@ -0,0 +1,131 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+
+class TokenBucket:
+    """
+        Token bucket refilled continuously at `per_minute / 60` per second.
+        Bursts are limited to one second worth of capacity, so a fresh bucket
+        does not fire a whole minute of requests at once.
+    """
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate)
+        self.available = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.available = min(
+            self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken, expects `refill` to be called first"""
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+
+class RateLimiter:
+    """
+        Client side pacing for LLM requests, shared by every thread.
+
+        Requests are paced by requests/min and tokens/min buckets, and a 429
+        or 5xx response pauses everyone until the server's `Retry-After` or a
+        jittered exponential backoff has passed. With `max_in_flight`, at
+        most that many requests are sent at once, whichever thread pool they
+        come from; every `acquire` must be followed by a `release`.
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 max_retries: int = 6, base_delay: float = 1.0, max_delay: float = 60.0,
+                 max_in_flight: Optional[int] = None):
+        self.in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self.lock = threading.Lock()
+        self.blocked_until = 0.0
+
+    def acquire(self, tokens: int = 0):
+        """Block until a request of roughly `tokens` tokens may be sent"""
+        if self.in_flight is not None:
+            self.in_flight.acquire()
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                delay = self.blocked_until - now
+                for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+                    if bucket is not None:
+                        bucket.refill(now)
+                        delay = max(delay, bucket.wait_time(amount, now))
+                if delay <= 0:
+                    if self.requests is not None:
+                        self.requests.available -= 1
+                    if self.tokens is not None:
+                        self.tokens.available -= tokens
+                    return
+            time.sleep(delay)
+
+    def release(self):
+        """The request taken by `acquire` is done"""
+        if self.in_flight is not None:
+            self.in_flight.release()
+
+    def record_usage(self, estimated: int, actual: Optional[int]):
+        """Correct the token bucket once the real usage of a request is known"""
+        if self.tokens is None or actual is None:
+            return
+        with self.lock:
+            self.tokens.available -= actual - estimated
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None,
+                rate_limited: bool = False) -> float:
+        """
+            Wait after a failed attempt and return the delay, the server's
+            `Retry-After` wins over the exponential backoff. Rate limits and
+            `Retry-After` pause every request, other failures only the
+            request that failed.
+        """
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, self.base_delay)
+        else:
+            delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        if not rate_limited and retry_after is None:
+            time.sleep(delay)
+            return delay
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        return delay
+
+
+def parse_retry_after(headers) -> Optional[float]:
+    """Seconds to wait according to `retry-after-ms` or `retry-after` response headers"""
+    if headers is None:
+        return None
+    value = headers.get('retry-after-ms')
+    if value is not None:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
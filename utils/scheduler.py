@@ -0,0 +1,96 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional
+
+DEFAULT_CONCURRENCY = 8
+
+
+class Task:
+    """
+        A unit of work in the scheduler DAG, it runs once all its dependencies are done
+    """
+
+    def __init__(self, fn: Callable[[], Any], on_done: Optional[Callable[[Any], None]] = None):
+        self.fn = fn
+        self.on_done = on_done
+        self.waiting_on = 0
+        self.dependents: list['Task'] = []
+
+
+class DagScheduler:
+    """
+        Runs tasks on a thread pool as soon as their dependencies are finished.
+
+        `fn` runs inside a worker thread, `on_done` runs in the thread calling
+        `run()`, so callbacks can safely write shared state such as the project
+        knowledge base. A task only starts after the `on_done` of all its
+        dependencies has returned.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = max(1, concurrency)
+        self.tasks: list[Task] = []
+        self.deferred = 0
+
+    def add(self, fn: Callable[[], Any], deps: list[Task] = (),
+            on_done: Optional[Callable[[Any], None]] = None) -> Task:
+        task = Task(fn, on_done)
+        for dep in deps:
+            dep.dependents.append(task)
+            task.waiting_on += 1
+        self.tasks.append(task)
+        return task
+
+    def run(self, on_task_done: Optional[Callable[[Task], None]] = None,
+            deferrable: tuple[type[BaseException], ...] = ()):
+        """
+            Run every task. If a task fails or the run is interrupted, tasks
+            that already finished are still reported before the error is
+            raised, tasks that did not start are cancelled.
+
+            A task raising one of the `deferrable` exceptions is counted in
+            `deferred` and its dependents are left waiting instead of failing
+            the run.
+        """
+        self.deferred = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            running: dict[Future, Task] = {}
+
+            def submit(task: Task):
+                running[pool.submit(task.fn)] = task
+
+            def finish(future: Future):
+                task = running.pop(future)
+                if deferrable and isinstance(future.exception(), deferrable):
+                    self.deferred += 1
+                    return None
+                result = future.result()
+                if task.on_done is not None:
+                    task.on_done(result)
+                if on_task_done is not None:
+                    on_task_done(task)
+                # Let finished work, e.g. function sources, be freed
+                task.fn = task.on_done = None
+                return task
+
+            for task in self.tasks:
+                if task.waiting_on == 0:
+                    submit(task)
+
+            try:
+                while running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        task = finish(future)
+                        if task is None:
+                            continue
+                        for dependent in task.dependents:
+                            dependent.waiting_on -= 1
+                            if dependent.waiting_on == 0:
+                                submit(dependent)
+            except BaseException:
+                for future in list(running):
+                    if future.cancel():
+                        running.pop(future)
+                    elif future.done() and future.exception() is None:
+                        finish(future)
+                raise
@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+import time
+from typing import Optional
+
+
+class Span:
+    """Times a `with` block and reports it to the `Tracer` as a complete event"""
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name: str, args: Optional[dict]):
+        self.name = name
+        self.args = args
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        Tracer.add(self.name, self.start, time.monotonic(), self.args)
+        return False
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    """
+        Collects timed spans of the pipeline stages (walk, parse, extract, LLM
+        queue and network time, knowledge base I/O, README writing) while
+        active, and exports them as Chrome trace events or percentiles per
+        stage. Spans cost a single check while tracing is off.
+
+        Times come from `time.monotonic`, which is shared by the processes
+        of the parse pool on Linux.
+    """
+    active: bool = False
+    # (name, start, end, pid, thread id, args)
+    events: list[tuple] = []
+    threads: dict[int, str] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def start(cls):
+        cls.active = True
+        cls.events = []
+        cls.threads = {}
+
+    @classmethod
+    def span(cls, name: str, **args) -> Span:
+        if not cls.active:
+            return NULL_SPAN
+        return Span(name, args or None)
+
+    @classmethod
+    def add(cls, name: str, start: float, end: float, args: Optional[dict] = None,
+            pid: Optional[int] = None, tid: Optional[int] = None):
+        if not cls.active:
+            return
+        with cls._lock:
+            if tid is None:
+                tid = threading.get_ident()
+                if tid not in cls.threads:
+                    cls.threads[tid] = threading.current_thread().name
+            cls.events.append((name, start, end, pid or os.getpid(), tid, args))
+
+    @classmethod
+    def stages(cls) -> dict[str, list[float]]:
+        """Span durations in seconds by stage name, sorted"""
+        stages: dict[str, list[float]] = {}
+        for name, start, end, *_ in cls.events:
+            stages.setdefault(name, []).append(end - start)
+        for durations in stages.values():
+            durations.sort()
+        return stages
+
+    @classmethod
+    def export(cls, path: str):
+        """Write the spans as Chrome trace event JSON, for chrome://tracing or Perfetto"""
+        origin = min((event[1] for event in cls.events), default=0.0)
+        events = [
+            {"name": name, "cat": name.split('.')[0], "ph": "X",
+             "ts": (start - origin) * 1e6, "dur": (end - start) * 1e6,
+             "pid": pid, "tid": tid, **({"args": args} if args else {})}
+            for name, start, end, pid, tid, args in cls.events
+        ]
+        events += [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid,
+             "args": {"name": name}}
+            for tid, name in cls.threads.items()
+        ]
+        with open(path, 'w') as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    @classmethod
+    def summary(cls) -> str:
+        lines = [f"{'stage':<24}{'count':>8}{'total s':>10}{'p50 ms':>10}"
+                 f"{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        stages = cls.stages()
+        for name in sorted(stages, key=lambda n: -sum(stages[n])):
+            durations = stages[name]
+            lines.append(
+                f"{name:<24}{len(durations):>8}{sum(durations):>10.2f}"
+                + ''.join(f"{percentile(durations, p) * 1000:>10.1f}" for p in (50, 95, 99))
+                + f"{durations[-1] * 1000:>10.1f}")
+        return '\n'.join(lines)
+
+
+def percentile(durations: list[float], p: float) -> float:
+    """Nearest rank percentile of sorted durations"""
+    rank = max(1, -(-len(durations) * p // 100))
+    return durations[int(rank) - 1]
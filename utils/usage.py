@@ -0,0 +1,123 @@
+import heapq
+from typing import Any, Callable, Optional
+
+from llms import LLMDryRun, LLMUsage, RequestUsage, request_cost, usage_scope
+from models import NodeRecord, ProjectKnowledgeBase
+from utils.scheduler import DagScheduler, Task
+from utils.tracing import Tracer
+
+LEVELS = ('function', 'file', 'directory')
+
+
+class UsageTracker:
+    """
+        Collects the LLM usage of every scheduler task of a run. Finished
+        tasks record it onto the nodes they documented and per level into
+        the project knowledge base.
+    """
+
+    def __init__(self, project: ProjectKnowledgeBase):
+        self.project = project
+        self.tasks: dict[Task, RequestUsage] = {}
+        self.task_levels: dict[Task, str] = {}
+        self.task_nodes: dict[Task, list[NodeRecord]] = {}
+        self.levels: dict[str, RequestUsage] = {}
+
+    def add(self, scheduler: DagScheduler, level: str, nodes: list[NodeRecord],
+            fn: Callable[[], Any], deps: list[Task] = (),
+            on_done: Optional[Callable[[Any], None]] = None) -> Task:
+        usage = RequestUsage()
+
+        def run():
+            token = usage_scope.set(usage)
+            try:
+                with Tracer.span(f"document.{level}", node=nodes[0].gid):
+                    return fn()
+            finally:
+                usage_scope.reset(token)
+
+        def done(result):
+            if on_done is not None:
+                on_done(result)
+            self.record(level, nodes, usage)
+
+        task = scheduler.add(run, deps, on_done=done)
+        self.tasks[task] = usage
+        self.task_levels[task] = level
+        self.task_nodes[task] = nodes
+        return task
+
+    def level_totals(self) -> dict[str, int]:
+        totals = {level: 0 for level in LEVELS}
+        for level in self.task_levels.values():
+            totals[level] += 1
+        return totals
+
+    def record(self, level: str, nodes: list[NodeRecord], usage: RequestUsage):
+        if not usage.requests:
+            # Answered from the cache, the nodes keep what they last cost
+            return
+        self.levels.setdefault(level, RequestUsage()).merge(usage)
+        self.project.add_usage(level, usage.requests, usage.prompt_tokens,
+                               usage.cached_tokens, usage.completion_tokens)
+        # A batch request is shared evenly by its functions
+        count = len(nodes)
+        for i, node in enumerate(nodes):
+            node.prompt_tokens = usage.prompt_tokens // count + (i < usage.prompt_tokens % count)
+            node.cached_tokens = usage.cached_tokens // count + (i < usage.cached_tokens % count)
+            node.completion_tokens = (usage.completion_tokens // count
+                                      + (i < usage.completion_tokens % count))
+
+    def estimated_seconds(self, concurrency: int) -> float:
+        """
+            Wall time of the run if every task took the time of its requests,
+            with at most `concurrency` tasks running at once
+        """
+        slots = [0.0] * max(1, concurrency)
+        ready: dict[Task, float] = {}
+        end = 0.0
+        # Tasks were added after their dependencies
+        for task, usage in self.tasks.items():
+            start = max(ready.get(task, 0.0), heapq.heappop(slots))
+            finish = start + usage.seconds
+            heapq.heappush(slots, finish)
+            for dependent in task.dependents:
+                ready[dependent] = max(ready.get(dependent, 0.0), finish)
+            end = max(end, finish)
+        return end
+
+
+def dry_run_report(tracker: UsageTracker, concurrency: int,
+                   requests_per_minute: Optional[float] = None,
+                   tokens_per_minute: Optional[float] = None) -> str:
+    lines = [f"Dry run: {len(tracker.tasks)} nodes to document, "
+             f"{LLMUsage.cache_hits} requests answered from the LLM cache"]
+
+    lines.append(f"{'model':<16}{'requests':>10}{'prompt':>12}{'cached':>12}"
+                 f"{'completion':>12}{'cost USD':>11}")
+    requests = tokens = 0
+    total_cost = 0.0
+    for model, (count, prompt, cached, completion) in sorted(LLMDryRun.models.items()):
+        cost = request_cost(model, prompt, cached, completion)
+        lines.append(f"{model:<16}{count:>10}{prompt:>12}{cached:>12}{completion:>12}{cost:>11.4f}")
+        requests += count
+        tokens += prompt + completion
+        total_cost += cost
+    lines.append(f"{'total':<16}{requests:>10}{'':>36}{total_cost:>11.4f}")
+
+    lines.append(f"\n{'level':<16}{'requests':>10}{'prompt':>12}{'cached':>12}{'completion':>12}")
+    for level in LEVELS:
+        usage = tracker.levels.get(level)
+        if usage is not None:
+            lines.append(f"{level:<16}{usage.requests:>10}{usage.prompt_tokens:>12}"
+                         f"{usage.cached_tokens:>12}{usage.completion_tokens:>12}")
+
+    seconds = tracker.estimated_seconds(concurrency)
+    # Client side limits bound the run from below whatever the concurrency
+    if requests_per_minute:
+        seconds = max(seconds, requests * 60 / requests_per_minute)
+    if tokens_per_minute:
+        seconds = max(seconds, tokens * 60 / tokens_per_minute)
+    lines.append(f"\nEstimated wall time at concurrency {concurrency}: "
+                 f"{seconds / 60:.1f} min ({seconds:.0f} s)")
+    return '\n'.join(lines)
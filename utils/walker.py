@@ -0,0 +1,121 @@
+import os
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from gitignore import IgnoreRules
+
+# Never documented, and usually the largest directory of a checkout
+ALWAYS_SKIPPED = {'.git'}
+
+
+class FileIndex:
+    """
+        Directory listings of a project, relative to `project_dir`, shared by
+        file discovery and directory documentation so the tree is only read
+        once. Directories that were not walked are scanned on first use.
+    """
+
+    def __init__(self, project_dir: str, ignore_rules: IgnoreRules):
+        self.project_dir = project_dir
+        self.ignore_rules = ignore_rules
+        # relative dir -> (subdirectory names, file names), both sorted
+        self.dirs: dict[str, tuple[list[str], list[str]]] = {}
+
+    def scan(self, rel_dir: str) -> Optional[tuple[list[str], list[str]]]:
+        path = os.path.join(self.project_dir, rel_dir)
+        subdirs, files = [], []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.name in ALWAYS_SKIPPED:
+                        continue
+                    is_dir = entry.is_dir()
+                    # Ignored directories are pruned with everything below
+                    if self.ignore_rules.match(
+                            os.path.join(rel_dir, entry.name), is_dir):
+                        continue
+                    if is_dir:
+                        subdirs.append(entry.name)
+                    else:
+                        files.append(entry.name)
+        except OSError as e:
+            print(f"Error reading directory {path}: {e}")
+            return None
+        listing = (sorted(subdirs), sorted(files))
+        self.dirs[rel_dir] = listing
+        return listing
+
+    def listing(self, rel_dir: str) -> Optional[tuple[list[str], list[str]]]:
+        if rel_dir in self.dirs:
+            return self.dirs[rel_dir]
+        return self.scan(rel_dir)
+
+    def walk(self, workers: int = 1) -> 'FileIndex':
+        """
+            Scan the whole tree breadth first, with `workers` threads listing
+            directories of the same level in parallel (useful on network
+            filesystems where every listing is a round trip)
+        """
+        level = ['']
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            while level:
+                next_level = []
+                for rel_dir, listing in zip(level, pool.map(self.scan, level)):
+                    if listing is None:
+                        continue
+                    next_level += [os.path.join(rel_dir, d) for d in listing[0]]
+                level = next_level
+        return self
+
+    def files(self) -> list[str]:
+        """Full paths of every file that was indexed"""
+        return [
+            os.path.join(self.project_dir, rel_dir, name)
+            for rel_dir, (_, files) in sorted(self.dirs.items())
+            for name in files
+        ]
+
+    @classmethod
+    def from_git(cls, project_dir: str, ignore_rules: IgnoreRules) -> Optional['FileIndex']:
+        """
+            Build the index from `git ls-files`, tracked and untracked but not
+            ignored files, without touching the filesystem. Returns None when
+            `project_dir` is not inside a git work tree.
+        """
+        def ls_files(*args) -> Optional[list[str]]:
+            try:
+                result = subprocess.run(
+                    ['git', '-C', project_dir, 'ls-files', '-z', *args],
+                    capture_output=True,
+                )
+            except OSError:
+                return None
+            if result.returncode != 0:
+                return None
+            return [p for p in result.stdout.decode('utf-8').split('\0') if p]
+
+        paths = ls_files('--cached', '--others', '--exclude-standard')
+        if paths is None:
+            return None
+        deleted = set(ls_files('--deleted') or [])
+
+        index = cls(project_dir, ignore_rules)
+        dirs: dict[str, tuple[set[str], list[str]]] = {'': (set(), [])}
+        for path in paths:
+            if path in deleted:
+                continue
+            rel_dir, name = os.path.split(path)
+            dirs.setdefault(rel_dir, (set(), []))[1].append(name)
+            while rel_dir:
+                parent, name = os.path.split(rel_dir)
+                subdirs = dirs.setdefault(parent, (set(), []))[0]
+                if name in subdirs:
+                    break
+                subdirs.add(name)
+                rel_dir = parent
+        index.dirs = {
+            rel_dir: (sorted(subdirs), sorted(files))
+            for rel_dir, (subdirs, files) in dirs.items()
+        }
+        return index